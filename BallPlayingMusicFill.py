@@ -1,20 +1,26 @@
 import cv2
 import numpy as np
-from moviepy import VideoClip, CompositeVideoClip, CompositeAudioClip, TextClip, ColorClip
+from moviepy import VideoClip, CompositeVideoClip, ColorClip
 from ball import Ball
-from music import build_song_audio, build_clip_audio, merge_bounce_times
+from events import EventLog, KIND_BALL
+import kernels
+from music import impact_gain, merge_bounce_times, write_audio_track
 from obstacle import CircleWithGap
 from config import CONFIG as DEFAULT_CONFIG
+from outputs import DEFAULT_OUTPUTS, render_outputs, finalize_outputs, discard_outputs
+from profiler import FrameProfiler
+from renderer import make_renderer
+from text_cache import cached_text_clip
 import os
+import contextlib
+import concurrent.futures
 
-bounce_times = []
-
-def record_bounce(t):
-    bounce_times.append(t)
-
-def create_balls(config):
+def create_balls(config, colors=None, border_colors=None):
+    """One ball per entry of config["BALLS"] (overrides on top of BALL_SETTINGS), or a single BALL_SETTINGS ball."""
     balls = []
-    balls.append(Ball(config["VIDEO_SIZE"], **config["BALL_SETTINGS"]))
+    for overrides in config.get("BALLS") or [{}]:
+        settings = {**config["BALL_SETTINGS"], **overrides}
+        balls.append(Ball(config["VIDEO_SIZE"], colors=colors, border_colors=border_colors, **settings))
     return balls
 
 def create_obstacles(config):
@@ -45,13 +51,13 @@ def resolve_ball_collision(ball1, ball2):
     delta = ball1.pos - ball2.pos
     dist = np.linalg.norm(delta)
     if dist == 0 or dist >= ball1.radius + ball2.radius:
-        return False
+        return None
 
     norm = delta / dist
     rel_vel = ball1.velocity - ball2.velocity
     vel_along_norm = np.dot(rel_vel, norm)
     if vel_along_norm > 0:
-        return False
+        return None
 
     restitution = min(ball1.restitution, ball2.restitution)
     impulse = -(1 + restitution) * vel_along_norm / 2
@@ -71,123 +77,227 @@ def resolve_ball_collision(ball1, ball2):
     if ball2.is_moving:
         ball2.pos -= norm * overlap
 
-    return True
+    # Closing speed, for the event log; 0.0 still counts as a collision
+    return -vel_along_norm
+
+class Scene:
+    """Everything one render mutates: palettes, balls, obstacles (incl. gap active flags) and the event log.
+
+    Nothing here is shared between Scene instances, so several scenes can render
+    concurrently on threads of one process."""
+
+    def __init__(self, config, colors=None, border_colors=None):
+        self.config = config
+        self.colors = colors
+        self.border_colors = border_colors
+        self.events = EventLog(config["FPS"])
+        self.reset()
+
+    def reset(self):
+        """Fresh balls/obstacles for another pass over the same scene; recorded events are kept."""
+        self.balls = create_balls(self.config, self.colors, self.border_colors)
+        self.obstacles = create_obstacles(self.config)
+
+    def make_frame_factory(self, record_events=True, profiler=None):
+        events = self.events if record_events else EventLog(self.config["FPS"])
+        return make_frame_factory(self.balls, self.obstacles, events, self.config, profiler)
+
+    def audio_events(self):
+        return audio_events(self.events.data, self.balls, self.config)
+
+def update_balls(balls, dt, t):
+    for ball in balls:
+        ball.update(dt, t)
+
+def handle_collisions(balls, obstacles, t, events=None):
+    """Obstacle then ball-ball collisions for one frame, recording one row per ball hit into events."""
+    for k, obstacle in enumerate(obstacles):
+        for i, ball in enumerate(balls):
+            obstacle.handle_collision(ball, t, events, i, k)
 
-def make_frame_factory(balls, obstacles, bounce_times, collision_events, config):
-    previous_t = [0.0]
     collided_pairs = set()
+    for i, ball1 in enumerate(balls):
+        for j, ball2 in enumerate(balls):
+            if j <= i:
+                continue
+            pair_key = tuple(sorted((ball1.id, ball2.id)))
+            if pair_key not in collided_pairs:
+                impact_speed = resolve_ball_collision(ball1, ball2)
+                if impact_speed is not None:
+                    collided_pairs.add(pair_key)
+                    if events is not None:
+                        # Where the separated balls touch
+                        contact = (ball1.pos * ball2.radius + ball2.pos * ball1.radius) / (ball1.radius + ball2.radius)
+                        events.record(t, i, j, KIND_BALL, contact[0], contact[1], impact_speed)
+                        events.record(t, j, i, KIND_BALL, contact[0], contact[1], impact_speed)
+
+def audio_events(events, balls, config):
+    """Splits event rows per BALL_AUDIO into song-mode bounce times and clip-mode (t, path, gain) events.
+
+    Clip gain follows impact speed when IMPACT_VOLUME_SPEED is set (see music.impact_gain)."""
+    bounce_times = np.empty(0)
+    clip_events = []
+    gains = impact_gain(events["speed"], config.get("IMPACT_VOLUME_SPEED"))
+    for i, ball in enumerate(balls):
+        ball_cfg = config["BALL_AUDIO"].get(str(ball.id), {})
+        mode = ball_cfg.get("mode", "clip")
+        path = ball_cfg.get("path")
+        hits = events["ball"] == i
+        if mode == "clip" and path:
+            clip_events.extend((t, path, gain) for t, gain in zip(events["time"][hits].tolist(), gains[hits].tolist()))
+        elif mode == "song":
+            bounce_times = np.concatenate([bounce_times, events["time"][hits]])
+    return bounce_times, clip_events
+
+def track_events(scene):
+    """Tracking pass: steps the physics for every frame time without drawing and fills scene.events.
+
+    Uses the array kernels (Numba-compiled when installed) when they reproduce the scene
+    (kernels.tracks), otherwise steps the regular objects the way make_frame does."""
+    fps = scene.config["FPS"]
+    # Same frame times as moviepy's iter_frames
+    times = np.arange(int(scene.config["VIDEO_DURATION"] * fps)) / fps
+    if kernels.tracks(scene.balls, scene.obstacles):
+        kernels.record_trace_events(kernels.simulate_scene(scene.balls, scene.obstacles, times), scene.events)
+        return
+    previous_t = 0.0
+    for t in times:
+        update_balls(scene.balls, t - previous_t, t)
+        previous_t = t
+        handle_collisions(scene.balls, scene.obstacles, t, scene.events)
+
+def scene_primitives(balls, obstacles, t):
+    """Everything to paint at time t, obstacles first, in draw order."""
+    prims = []
+    for obstacle in obstacles:
+        prims.extend(obstacle.primitives(t))
+    for ball in balls:
+        prims.extend(ball.primitives(t))
+    return prims
+
+def make_frame_factory(balls, obstacles, events, config, profiler=None):
+    previous_t = [0.0]
+    section = profiler.section if profiler else (lambda name: contextlib.nullcontext())
+    renderer = make_renderer(config, balls, obstacles)
 
     def make_frame(t):
         real_dt = t - previous_t[0]
         previous_t[0] = t
-        collided_pairs.clear()
-
-        for ball in balls:
-            ball.update(real_dt, t)
-
-        frame = np.full((config["VIDEO_SIZE"][1], config["VIDEO_SIZE"][0], 3), config["BACKGROUND_COLOR"], dtype=np.uint8)
-
-        for obstacle in obstacles:
-            for ball in balls:
-                def on_collision(t=t, ball_id=ball.id, *_):
-                    ball_cfg = config["BALL_AUDIO"].get(str(ball_id), {})
-                    mode = ball_cfg.get("mode", "clip")
-                    path = ball_cfg.get("path")
-                    if mode == "clip" and path:
-                        collision_events.append((t, path))
-                    elif mode == "song":
-                        bounce_times.append(t)
-                obstacle.handle_collision(ball, t, on_collision=on_collision)
-            obstacle.draw(frame, t)
-
-        for i, ball1 in enumerate(balls):
-            for j, ball2 in enumerate(balls):
-                if j <= i:
-                    continue
-                pair_key = tuple(sorted((ball1.id, ball2.id)))
-                if pair_key not in collided_pairs:
-                    if resolve_ball_collision(ball1, ball2):
-                        collided_pairs.add(pair_key)
-                        for b in (ball1, ball2):
-                            ball_cfg = config["BALL_AUDIO"].get(str(b.id), {})
-                            mode = ball_cfg.get("mode", "clip")
-                            path = ball_cfg.get("path")
-                            if mode == "clip" and path:
-                                collision_events.append((t, path))
-                            elif mode == "song":
-                                bounce_times.append(t)
-
-        for ball in balls:
-            ball.draw(frame, t)
-
+        if profiler:
+            profiler.begin_frame(t)
+
+        with section("ball_update"):
+            update_balls(balls, real_dt, t)
+
+        n_events = len(events)
+        with section("collisions"):
+            handle_collisions(balls, obstacles, t, events)
+
+        # Obstacle and ball/trail draw calls are built separately so each shows up in the profile;
+        # the renderer paints them in one pass (raster) and times the two groups' drawing inside it
+        with section("obstacle_primitives"):
+            prims = scene_primitives((), obstacles, t)
+        split = len(prims)
+
+        with section("ball_primitives"):
+            prims.extend(scene_primitives(balls, (), t))
+
+        with section("raster"):
+            frame = renderer.render(prims, split)
+
+        if profiler:
+            profiler.add("obstacle_draw", renderer.draw_seconds[0])
+            profiler.add("ball_draw", renderer.draw_seconds[1])
+            profiler.count("collisions", len(events) - n_events)
+            profiler.count("trail_points", sum(ball.trail_points_drawn for ball in balls))
+            profiler.count("pixels_filled", renderer.pixels_filled)
+            profiler.count("damage_rects", len(renderer.damage))
+            profiler.count("damage_pixels", renderer.damage_area)
+            profiler.end_frame()
         return frame
 
+    make_frame.renderer = renderer
     return make_frame
 
 def create_text_clips(config):
     clips = []
     for clip_cfg in config["TEXT_CLIPS"]:
-        clip = TextClip(
-            font=config["FONT_PATH"],
+        clip = cached_text_clip(
             text=clip_cfg["text"],
+            font=config["FONT_PATH"],
             font_size=clip_cfg["font_size"],
-            color="#%02x%02x%02x" % tuple(config["TEXT_COLOR"])
-        ).with_duration(config["VIDEO_DURATION"]).with_position(clip_cfg["position"]).with_opacity(clip_cfg["opacity"])
+            color=config["TEXT_COLOR"],
+            opacity=clip_cfg["opacity"],
+            duration=config["VIDEO_DURATION"],
+            position=clip_cfg["position"]
+        )
         clips.append(clip)
     return clips
 
 # 🔧 MAIN FUNCTION — NEW
-def generate_video(config, colors=None):
-    global bounce_times
+def generate_video(config, colors=None, logger="bar"):
+    if config.get("STREAM_TARGET"):
+        # Live output is a single real-time pass; imported here because streaming builds on this module
+        from streaming import stream_video
+        return stream_video(config, colors)
 
-    if colors:
-        Ball.COLORS = colors
+    scene = Scene(config, colors)
 
     background = ColorClip(size=config["VIDEO_SIZE"], color=config["BACKGROUND_COLOR"], duration=config["VIDEO_DURATION"])
 
-    bounce_times = []
-    collision_events = []
-
-    balls = create_balls(config)
-    obstacles = create_obstacles(config)
-
-    frame_fn_track = make_frame_factory(balls, obstacles, bounce_times, collision_events, config)
-    clip_track = VideoClip(lambda t: frame_fn_track(t), duration=config["VIDEO_DURATION"])
-    video_track = CompositeVideoClip([background, clip_track] + ([] if config["DEV_MODE"] else create_text_clips(config)))
-    video_track.write_videofile("temp_tracking_pass.mp4", fps=config["FPS"], codec="libx264", audio=False)
-
+    # Tracking pass: simulate every frame once, without drawing, to collect the bounce events the audio is built from
+    track_events(scene)
+    bounce_times, clip_events = scene.audio_events()
     collision_intervals = merge_bounce_times(bounce_times)
 
-    balls = create_balls(config)
-    obstacles = create_obstacles(config)
-    frame_fn_final = make_frame_factory(balls, obstacles, bounce_times=[], collision_events=[], config=config)
+    scene.reset()
+    profiler = FrameProfiler(config["FPS"], name="final_pass") if config.get("PROFILE") else None
+    frame_fn_final = scene.make_frame_factory(record_events=False, profiler=profiler)
     clip_final = VideoClip(lambda t: frame_fn_final(t), duration=config["VIDEO_DURATION"])
     video_final = CompositeVideoClip([background, clip_final] + create_text_clips(config))
 
-    song_audio = build_song_audio(
-        duration=config["VIDEO_DURATION"],
-        collision_intervals=collision_intervals,
-        song_path=config["SONG_PATH"],
-        volume=config["VOLUME"],
-        fps=config["AUDIO_FPS"]
-    )
-
-    clip_audio = build_clip_audio(
-        duration=config["VIDEO_DURATION"],
-        collision_events=collision_events,
-        fps=config["AUDIO_FPS"]
-    )
-
-    if song_audio and clip_audio:
-        combined_audio = CompositeAudioClip([song_audio, clip_audio])
-        video_final = video_final.with_audio(combined_audio)
-    elif song_audio:
-        video_final = video_final.with_audio(song_audio)
-    elif clip_audio:
-        video_final = video_final.with_audio(clip_audio)
-
     os.makedirs(os.path.dirname(config["OUTPUT_FILE"]), exist_ok=True)
-    video_final.write_videofile(config["OUTPUT_FILE"], fps=config["FPS"], codec="libx264", audio_codec="aac", preset="ultrafast", threads=2)
+    output_base = os.path.splitext(config["OUTPUT_FILE"])[0]
+    temp_audio = output_base + "_audio.tmp.wav"
+
+    # Bounce events are final after the tracking pass, so decode/concatenate/render the audio
+    # to a WAV in the background while the frames are rendered, then mux the two at the end.
+    sinks = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as audio_executor:
+            audio_future = audio_executor.submit(
+                write_audio_track,
+                temp_audio,
+                duration=config["VIDEO_DURATION"],
+                collision_intervals=collision_intervals,
+                collision_events=clip_events,
+                song_path=config["SONG_PATH"],
+                volume=config["VOLUME"],
+                fps=config["AUDIO_FPS"]
+            )
+            # One simulation + rasterization pass feeds every deliverable in OUTPUTS
+            sinks = render_outputs(video_final, config.get("OUTPUTS") or DEFAULT_OUTPUTS, output_base, config["FPS"],
+                                   logger=logger)
+            audio_path = audio_future.result()
+
+        finalize_outputs(sinks, audio_path)
+    except BaseException:
+        # Leave no half-written .tmp.mp4 files behind in the output directory
+        discard_outputs(sinks)
+        raise
+    finally:
+        # The executor has waited for the audio job, so the WAV (if any) is complete and unused now
+        if os.path.exists(temp_audio):
+            os.remove(temp_audio)
+
+    if config.get("EXPORT_EVENTS"):
+        scene.events.save(output_base + "_events.npz")
+
+    if profiler:
+        profiler.print_summary()
+        profiler.export(os.path.splitext(config["OUTPUT_FILE"])[0] + "_profile")
+
+    return scene
 
 # 🔁 Legacy support: run one video directly
 if __name__ == "__main__":
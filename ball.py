@@ -1,6 +1,7 @@
-import cv2
 import numpy as np
 
+import primitives
+
 class Ball:
     COLORS = [
     (0, 0, 255), (14, 0, 255), (28, 0, 255), (42, 0, 255), (56, 0, 255), (71, 0, 255), (85, 0, 255), (99, 0, 255), (113, 0, 255), (128, 0, 255), (128, 0, 255), (113, 0, 255), (99, 0, 255), (85, 0, 255), (71, 0, 255), (56, 0, 255), (42, 0, 255), (28, 0, 255), (14, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255), (0, 0, 255)
@@ -29,8 +30,11 @@ class Ball:
                  grow_start_radius=None, grow_end_radius=None,
                  grow_start_time=None, grow_end_time=None,
                  initial_velocity=None, trail_lock_appearance=False,
-                 border_color_mode="static"):
+                 border_color_mode="static", colors=None, border_colors=None):
         self.id = id
+        # Per-ball palettes so scenes with different gradients can live in one process
+        self.colors = [tuple(c) for c in colors] if colors else self.COLORS
+        self.border_colors = [tuple(c) for c in border_colors] if border_colors else self.BORDER_COLORS
         self.video_width, self.video_height = video_size
         self.radius = radius
         self.pos = np.array(start_pos if start_pos else [video_size[0] / 2, video_size[1] / 2], dtype=float)
@@ -45,14 +49,14 @@ class Ball:
         self.speed_increment = speed_increment
         self.border_color_mode = border_color_mode
         self.border_color_index = 0
-        self.border_color = border_color if border_color is not None else self.BORDER_COLORS[0]
+        self.border_color = border_color if border_color is not None else self.border_colors[0]
         self.start_time = start_time
         self.move_start_time = move_start_time
         self.free_time = free_time
         self.color_index = 0 if start_color is None else (
-            self.COLORS.index(start_color) if start_color in self.COLORS else 0
+            self.colors.index(start_color) if start_color in self.colors else 0
         )
-        self.color = self.COLORS[self.color_index]
+        self.color = self.colors[self.color_index]
         self.frozen_color = frozen_color
         self.trail_enabled = trail_enabled
         self.trail_length = trail_length
@@ -63,6 +67,7 @@ class Ball:
         self.trail_match_radius = trail_match_radius
         self.trail = []
         self.trail_lock_appearance = trail_lock_appearance
+        self.trail_points_drawn = 0
         self.is_visible = False
         self.is_moving = False
         self.gravity_enabled = gravity_enabled
@@ -75,8 +80,8 @@ class Ball:
         self.grow_end_time = grow_end_time
 
     def next_color(self):
-        self.color_index = (self.color_index + 1) % len(self.COLORS)
-        self.color = self.COLORS[self.color_index]
+        self.color_index = (self.color_index + 1) % len(self.colors)
+        self.color = self.colors[self.color_index]
 
     def update(self, dt, current_time, on_bounce=None):
         if self.grow_start_radius is not None and self.grow_end_radius is not None and \
@@ -141,8 +146,8 @@ class Ball:
             self.next_color()
 
             if self.border_color_mode == "cycle":
-                self.border_color_index = (self.border_color_index + 1) % len(self.BORDER_COLORS)
-                self.border_color = self.BORDER_COLORS[self.border_color_index]
+                self.border_color_index = (self.border_color_index + 1) % len(self.border_colors)
+                self.border_color = self.border_colors[self.border_color_index]
 
             if on_bounce:
                 on_bounce(current_time)
@@ -150,10 +155,13 @@ class Ball:
         if np.linalg.norm(self.velocity) < 1e-3:
             self.velocity = np.zeros_like(self.velocity)
 
-    def draw(self, frame, current_time):
+    def primitives(self, current_time):
+        """Draw calls for trail and ball this frame, in paint order (see primitives.py)."""
+        self.trail_points_drawn = 0
         if not self.is_visible:
-            return
+            return []
 
+        prims = []
         if self.trail_enabled:
             for trail_point in self.trail:
                 if self.trail_lock_appearance:
@@ -172,12 +180,20 @@ class Ball:
                 draw_radius = int(radius if self.trail_lock_appearance else max(1, radius * alpha))
 
                 if border_color is not None:
-                    cv2.circle(frame, pos_int, draw_radius, border_color, -1)
+                    prims.append(primitives.circle(pos_int, draw_radius, border_color))
 
                 fill_radius = max(1, draw_radius - 3)
                 draw_color = (np.array(color) * alpha).astype(np.uint8).tolist() if not self.trail_lock_appearance else color
-                cv2.circle(frame, pos_int, fill_radius, draw_color, -1)
+                prims.append(primitives.circle(pos_int, fill_radius, draw_color))
+                self.trail_points_drawn += 1
 
-        cv2.circle(frame, tuple(self.pos.astype(int)), int(self.radius), self.color, -1)
+        prims.append(primitives.circle(self.pos.astype(int), self.radius, self.color))
         if self.border_color:
-            cv2.circle(frame, tuple(self.pos.astype(int)), int(self.radius), self.border_color, 3)
+            prims.append(primitives.circle(self.pos.astype(int), self.radius, self.border_color, 3))
+
+        return prims
+
+    def draw(self, frame, current_time):
+        """Draws trail and ball; returns (trail points drawn, approx. pixels filled)."""
+        pixels = primitives.draw_primitives(frame, self.primitives(current_time))
+        return self.trail_points_drawn, pixels
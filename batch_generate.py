@@ -6,12 +6,17 @@ import colorsys
 import concurrent.futures
 import contextlib
 import io
+import numpy as np
 from config import CONFIG as BASE_CONFIG
 from BallPlayingMusicFill import generate_video
+from text_cache import warm_text_cache
 
 # SETTINGS
 ENABLE_MULTIPROCESSING = True
 MAX_WORKERS = 5
+# Render scenes on threads of this process instead of one process per video.
+# Scenes keep no shared state, and OpenCV/ffmpeg release the GIL for the heavy work.
+USE_THREADS = False
 SKIP_EXISTING = True
 SILENT_MODE = True
 
@@ -57,15 +62,31 @@ CURATED_HUES = [
 ]
 ALL_GRADIENTS = [generate_multi_stop_gradient(h, 32) for h in CURATED_HUES] + generate_many_gradients(50)
 
+TEXT_VARIANTS = [
+    "Guess the song challenge!",
+    "Who know's the song?",
+    "Most people don't know the song!",
+    "Guess in the comments!",
+    "Guess the song! Ball gets bigger and faster!"
+]
+
 def pick_text_variant():
-    options = [
-        "Guess the song challenge!",
-        "Who know's the song?",
-        "Most people don't know the song!",
-        "Guess in the comments!",
-        "Guess the song! Ball gets bigger and faster!"
-    ]
-    return random.choice(options)
+    return random.choice(TEXT_VARIANTS)
+
+def warm_caches():
+    """Renders every text overlay a batch job can ask for (variant headline + static lines)."""
+    headline, *rest = BASE_CONFIG["TEXT_CLIPS"]
+    entries = [(text, headline["font_size"], headline["opacity"]) for text in TEXT_VARIANTS]
+    entries += [(clip["text"], clip["font_size"], clip["opacity"]) for clip in BASE_CONFIG["TEXT_CLIPS"]]
+    warm_text_cache(entries, BASE_CONFIG["FONT_PATH"], BASE_CONFIG["TEXT_COLOR"])
+
+def init_worker():
+    # Runs once per worker process: heavy imports are already loaded by this module,
+    # so only the first-use costs (cv2 init, font loading, text rasterization) are paid here.
+    import cv2
+    import numpy as np
+    cv2.circle(np.zeros((8, 8, 3), dtype=np.uint8), (4, 4), 2, (255, 255, 255), -1)
+    warm_caches()
 
 def build_config(song, output_path):
     song_name = os.path.splitext(song)[0]
@@ -100,6 +121,8 @@ def build_config(song, output_path):
 
     config["TEXT_CLIPS"][0]["text"] = pick_text_variant()
     config["OUTPUT_FILE"] = output_path
+    # Batch jobs always render files; a live STREAM_TARGET in the base config would make generate_video stream instead
+    config["STREAM_TARGET"] = None
 
     return config, gradient
 
@@ -120,31 +143,51 @@ def render_video(song):
             print(f"   🎨 Colors: {gradient[0]} ➝ {gradient[-1]}")
             print(f"   📽️ Output: {output_path}")
 
-            if SILENT_MODE:
+            if SILENT_MODE and USE_THREADS:
+                # redirect_stdout is process-wide, so threads only silence moviepy's progress bars
+                scene = generate_video(config, colors=gradient, logger=None)
+            elif SILENT_MODE:
                 with contextlib.redirect_stdout(io.StringIO()):
-                    generate_video(config, colors=gradient)
+                    scene = generate_video(config, colors=gradient, logger=None)
             else:
-                generate_video(config, colors=gradient)
+                scene = generate_video(config, colors=gradient)
 
-            return  # success
+            return scene.events.stats()  # success
 
         except Exception as e:
             print(f"❌ Error generating {song_name} (attempt {attempt + 1}): {e}")
 
     print(f"🚫 Skipped {song_name} after 2 failed attempts.\n")
 
+def print_batch_stats(results):
+    """Collision totals over the videos rendered in this batch (None entries were skipped or failed)."""
+    results = [r for r in results if r]
+    if not results:
+        return
+    collisions = np.array([r["collisions"] for r in results])
+    by_kind = {kind: sum(r["by_kind"][kind] for r in results) for kind in results[0]["by_kind"]}
+    print(f"📊 {len(results)} videos, {collisions.sum()} collisions "
+          f"(min {collisions.min()}, mean {collisions.mean():.1f}, max {collisions.max()} per video), "
+          f"max impact {max(r['max_impact_speed'] for r in results):.0f} px/s")
+    print("   " + ", ".join(f"{kind}: {n}" for kind, n in by_kind.items() if n))
+
 def generate_batch():
     os.makedirs("output", exist_ok=True)
     songs = [f for f in os.listdir("sounds") if f.endswith(".mp3")]
 
     print(f"🔄 Starting batch: {len(songs)} songs")
-    if ENABLE_MULTIPROCESSING:
-        with concurrent.futures.ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            executor.map(render_video, songs)
+    # Fill the on-disk text cache once so workers only load it
+    warm_caches()
+    if ENABLE_MULTIPROCESSING and USE_THREADS:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(executor.map(render_video, songs))
+    elif ENABLE_MULTIPROCESSING:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=init_worker) as executor:
+            results = list(executor.map(render_video, songs))
     else:
-        for song in songs:
-            render_video(song)
+        results = [render_video(song) for song in songs]
     print("\n✅ Batch complete!")
+    print_batch_stats(results)
 
 if __name__ == "__main__":
     generate_batch()
@@ -1,14 +1,28 @@
 CONFIG = {
     "DEV_MODE": False,
+    "PROFILE": False,  # per-frame timing report + chrome trace next to OUTPUT_FILE
     "VIDEO_DURATION": 28,
     "VIDEO_SIZE": (1080, 1920),
     "FPS": 60,
     "BACKGROUND_COLOR": (20, 20, 20),
+    "RENDER_MODE": "full",  # "full" redraws everything; "dirty" repaints only what moved since the last frame (wins on sparse scenes)
+    "RENDER_PALETTE": False,  # draw palette indices (1 byte/pixel), expand changed tiles to RGB; ~3x faster on fill-heavy scenes, slower with fading trails
     "FONT_PATH": "fonts/OpenSans_Condensed-Bold.ttf",
     "OUTPUT_FILE": "output/MillionDollarBaby.mp4",
+    # Set to e.g. "udp://127.0.0.1:5000", "rtmp://localhost/live/ball" or a named pipe path to stream live instead
+    "STREAM_TARGET": None,
+    # Deliverables rendered from the same frames; paths are OUTPUT_FILE's base + suffix
+    "OUTPUTS": [
+        {"kind": "video", "suffix": "", "preset": "ultrafast"},
+        # {"kind": "video", "suffix": "_720p", "size": (720, 1280), "preset": "veryfast", "crf": 26},
+        # {"kind": "preview", "suffix": "_preview", "size": (540, 960), "start": 0, "duration": 6, "crf": 30},
+        # {"kind": "thumbnails", "suffix": "_thumbs", "size": (180, 320), "count": 12, "columns": 6},
+    ],
     "SONG_PATH": "sounds/MillionDollarBaby.mp3",
     "VOLUME": 0.6,
     "AUDIO_FPS": 44100,
+    "IMPACT_VOLUME_SPEED": None,  # clip-mode hits play at impact speed / this (px/s), capped at full volume; None = always full
+    "EXPORT_EVENTS": False,  # save the collision event log next to OUTPUT_FILE as <base>_events.npz
     "TEXT_COLOR": (255, 255, 255),
     "TEXT_CLIPS": [
         {"text": "Guess the song challenge!", "font_size": 50, "position": ("center", 200), "opacity": 1.0},
@@ -54,6 +68,8 @@ CONFIG = {
         "border_color": (0, 0, 0),     # starting border color if static
         "initial_velocity": [1,-1],  # vx, vy in pixels/sec
     },
+    # Several balls: one BALL_SETTINGS override per ball, each with its own "id" (BALL_AUDIO key) and start state
+    "BALLS": [],
     "CIRCLE_OBSTACLE_COUNT": 1,
     "CIRCLE_OBSTACLE_START_RADIUS": 550,
     "CIRCLE_OBSTACLE_RADIUS_STEP": 50,
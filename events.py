@@ -0,0 +1,90 @@
+"""Columnar collision event log.
+
+Collision code writes one row per ball hit straight into a preallocated structured
+array (grown by doubling), so recording costs no per-event Python objects and audio,
+reports and exports can work on whole columns at once.
+"""
+import numpy as np
+
+# Event kinds; also the column order of golden traces and kernels.py
+KIND_OBSTACLE_CIRCLE = 0
+KIND_OBSTACLE_SQUARE = 1
+KIND_CIRCLE_WITH_GAP = 2
+KIND_BALL = 3
+COLLISION_KINDS = ["obstacle_circle", "obstacle_square", "circle_with_gap", "ball"]
+
+EVENT_DTYPE = np.dtype([
+    ("time", np.float64),
+    ("frame", np.int32),
+    ("ball", np.int16),      # index into the scene's balls
+    ("obstacle", np.int16),  # index into the scene's obstacles, or the other ball's index for ball hits
+    ("kind", np.uint8),
+    ("x", np.float32),       # contact point
+    ("y", np.float32),
+    ("speed", np.float32),   # closing speed along the contact normal before the bounce, px/s
+])
+
+class EventLog:
+    def __init__(self, fps, capacity=256):
+        self.fps = fps
+        self.rows = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def data(self):
+        """The recorded rows (a view, valid until the next record)."""
+        return self.rows[:self.count]
+
+    def since(self, start):
+        """Rows recorded after the first `start` ones."""
+        return self.rows[start:self.count]
+
+    def _reserve(self, n):
+        if self.count + n > len(self.rows):
+            rows = np.zeros(max(2 * len(self.rows), self.count + n), dtype=EVENT_DTYPE)
+            rows[:self.count] = self.rows[:self.count]
+            self.rows = rows
+
+    def record(self, t, ball, obstacle, kind, x, y, speed):
+        self._reserve(1)
+        self.rows[self.count] = (t, round(t * self.fps), ball, obstacle, kind, x, y, speed)
+        self.count += 1
+
+    def extend(self, time, ball, obstacle, kind, x, y, speed):
+        """Appends whole columns at once, e.g. the events of a kernels.simulate_scene trace."""
+        n = len(time)
+        self._reserve(n)
+        rows = self.rows[self.count:self.count + n]
+        rows["time"] = time
+        rows["frame"] = np.round(np.asarray(time) * self.fps)
+        rows["ball"] = ball
+        rows["obstacle"] = obstacle
+        rows["kind"] = kind
+        rows["x"] = x
+        rows["y"] = y
+        rows["speed"] = speed
+        self.count += n
+
+    def stats(self):
+        """Collision counts per kind and impact speeds, as plain numbers for JSON reports."""
+        data = self.data
+        counts = np.bincount(data["kind"], minlength=len(COLLISION_KINDS))
+        return {
+            "collisions": self.count,
+            "by_kind": {kind: int(n) for kind, n in zip(COLLISION_KINDS, counts)},
+            "mean_impact_speed": float(data["speed"].mean()) if self.count else 0.0,
+            "max_impact_speed": float(data["speed"].max()) if self.count else 0.0,
+        }
+
+    def save(self, path):
+        """Writes the rows to an .npz file (`events` array plus the `kinds` names)."""
+        np.savez_compressed(path, events=self.data, kinds=np.array(COLLISION_KINDS))
+        return path
+
+def load_events(path):
+    """The structured event array saved by EventLog.save."""
+    with np.load(path) as archive:
+        return archive["events"]
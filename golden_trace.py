@@ -0,0 +1,314 @@
+"""Golden-trace determinism harness.
+
+Runs the simulation headless for a set of reference configs and stores positions,
+velocities, radii, color indices and collision events per frame. Any alternative
+engine can then be checked against the stored traces:
+
+    python golden_trace.py record             # (re)write golden/*.npz with the reference engine
+    python golden_trace.py check              # compare the reference engine against golden/
+    python golden_trace.py check --engine X   # compare engine X
+
+The kernel engine is only checked on the configs the tracking pass runs it for
+(kernels.tracks); name a config to check it anyway. The tracking engine checks what
+generate_video uses for audio events.
+
+The same configs also check the renderers: every RENDER_MODE must produce the same
+pixels as a full redraw, and the time per frame of each is reported:
+
+    python golden_trace.py render [names] [--frames N]
+
+`render` also covers RENDER_CONFIGS, which only change drawing and have no golden trace.
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import CONFIG as DEFAULT_CONFIG
+from BallPlayingMusicFill import (Scene, create_balls, create_obstacles, update_balls, handle_collisions,
+                                  scene_primitives, track_events)
+from events import COLLISION_KINDS, EventLog
+from kernels import simulate_scene, tracks
+from renderer import make_renderer
+
+GOLDEN_DIR = "golden"
+
+# Position tolerance is in pixels, velocity in pixels/sec; collision events must match exactly.
+POS_TOLERANCE = 1e-3
+VEL_TOLERANCE = 1e-2
+
+REFERENCE_CONFIGS = {
+    "default": {},
+    "rotating_gap": {
+        "GAP_ANGLE_DEG": 40,
+        "CIRCLE_OBSTACLE_COUNT": 3,
+        "BALL_SETTINGS": {"grow_end_radius": 120},
+    },
+    "batch_style": {
+        "VIDEO_DURATION": 30,
+        "BALL_SETTINGS": {"start_speed": 230, "speed_increment": 90,
+                          "start_pos": [760, 780], "initial_velocity": [220, -180]},
+    },
+    "edges_no_gravity": {
+        "CIRCLE_OBSTACLE_COUNT": 0,
+        "BALL_SETTINGS": {"bounce_on_edges": True, "gravity_enabled": False, "restitution": 0.9,
+                          "grow_end_radius": 80},
+    },
+    "multi_ball": {
+        # Four growing balls in one ring, so ball-ball collisions happen (34 of them)
+        "BALL_SETTINGS": {"grow_end_radius": 120, "speed_increment": 10},
+        "BALLS": [
+            {"id": 0, "start_pos": [560, 460], "initial_velocity": [1, -1]},
+            {"id": 1, "start_pos": [400, 900], "initial_velocity": [1, 0.4]},
+            {"id": 2, "start_pos": [700, 1100], "initial_velocity": [-0.6, -1]},
+            {"id": 3, "start_pos": [540, 1300], "initial_velocity": [-1, 0.2]},
+        ],
+    },
+}
+
+# Configs that only differ in drawing (same physics as a reference config); used by `render` only
+RENDER_CONFIGS = {
+    "fading_trail": {
+        "BALL_SETTINGS": {"trail_lock_appearance": False, "trail_length": 40, "trail_fade_time": 0.6},
+    },
+}
+
+# Renderer settings compared by `render`; each is checked against the full redraw with the same palette setting
+RENDER_VARIANTS = {
+    "full": {"RENDER_MODE": "full"},
+    "dirty": {"RENDER_MODE": "dirty"},
+    "full+palette": {"RENDER_MODE": "full", "RENDER_PALETTE": True},
+    "dirty+palette": {"RENDER_MODE": "dirty", "RENDER_PALETTE": True},
+}
+
+def reference_config(name):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    overrides = copy.deepcopy(REFERENCE_CONFIGS[name] if name in REFERENCE_CONFIGS else RENDER_CONFIGS[name])
+    config["BALL_SETTINGS"].update(overrides.pop("BALL_SETTINGS", {}))
+    config.update(overrides)
+    config["FPS"] = 60
+    return config
+
+def frame_times(config):
+    n_frames = int(config["VIDEO_DURATION"] * config["FPS"])
+    return np.arange(n_frames) / config["FPS"]
+
+def run_reference(config, colors=None):
+    """Steps the regular Ball/obstacle objects exactly as make_frame does, without drawing."""
+    balls = create_balls(config, colors)
+    obstacles = create_obstacles(config)
+    times = frame_times(config)
+
+    positions = np.zeros((len(times), len(balls), 2))
+    velocities = np.zeros((len(times), len(balls), 2))
+    radii = np.zeros((len(times), len(balls)))
+    color_indices = np.zeros((len(times), len(balls)), dtype=np.int32)
+    events = EventLog(config["FPS"])
+
+    previous_t = 0.0
+    for frame_index, t in enumerate(times):
+        update_balls(balls, t - previous_t, t)
+        previous_t = t
+        handle_collisions(balls, obstacles, t, events)
+
+        for i, ball in enumerate(balls):
+            positions[frame_index, i] = ball.pos
+            velocities[frame_index, i] = ball.velocity
+            radii[frame_index, i] = ball.radius
+            color_indices[frame_index, i] = ball.color_index
+
+    return {
+        "times": times,
+        "positions": positions,
+        "velocities": velocities,
+        "radii": radii,
+        "color_indices": color_indices,
+        "events": golden_events(events),
+    }
+
+def golden_events(log):
+    """An EventLog's rows in the golden (frame, time, ball, kind) format."""
+    return np.column_stack([log.data[name] for name in ("frame", "time", "ball", "kind")]).astype(float)
+
+def run_kernel(config, colors=None):
+    """Array kernels from kernels.py (Numba-compiled when available)."""
+    return simulate_scene(create_balls(config, colors), create_obstacles(config), frame_times(config))
+
+def run_tracking(config, colors=None):
+    """generate_video's tracking pass: the events come from track_events itself, the
+    per-frame state from the engine it picks."""
+    scene = Scene(config, colors)
+    engine = run_kernel if tracks(scene.balls, scene.obstacles) else run_reference
+    trace = engine(config, colors)
+    track_events(scene)
+    trace["events"] = golden_events(scene.events)
+    return trace
+
+def kernel_tracked(name):
+    config = reference_config(name)
+    return tracks(create_balls(config), create_obstacles(config))
+
+ENGINES = {
+    "reference": run_reference,
+    "kernel": run_kernel,
+    "tracking": run_tracking,
+}
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, f"{name}.npz")
+
+def record(names, engine="reference"):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name in names:
+        trace = ENGINES[engine](reference_config(name))
+        np.savez_compressed(golden_path(name), **trace)
+        print(f"💾 {name}: {len(trace['times'])} frames, {len(trace['events'])} collisions ➝ {golden_path(name)}")
+
+def first_divergence(golden, trace, pos_tol=POS_TOLERANCE, vel_tol=VEL_TOLERANCE):
+    """Returns (frame_index, reason) for the first frame where trace leaves golden, or None."""
+    if golden["positions"].shape != trace["positions"].shape:
+        return 0, f"shape mismatch {golden['positions'].shape} vs {trace['positions'].shape}"
+
+    candidates = []
+
+    pos_err = np.abs(golden["positions"] - trace["positions"]).max(axis=(1, 2))
+    bad = np.nonzero(pos_err > pos_tol)[0]
+    if len(bad):
+        candidates.append((bad[0], f"position off by {pos_err[bad[0]]:.6f}px"))
+
+    vel_err = np.abs(golden["velocities"] - trace["velocities"]).max(axis=(1, 2))
+    bad = np.nonzero(vel_err > vel_tol)[0]
+    if len(bad):
+        candidates.append((bad[0], f"velocity off by {vel_err[bad[0]]:.6f}px/s"))
+
+    rad_err = np.abs(golden["radii"] - trace["radii"]).max(axis=1)
+    bad = np.nonzero(rad_err > pos_tol)[0]
+    if len(bad):
+        candidates.append((bad[0], f"radius off by {rad_err[bad[0]]:.6f}px"))
+
+    bad = np.nonzero((golden["color_indices"] != trace["color_indices"]).any(axis=1))[0]
+    if len(bad):
+        candidates.append((bad[0], "color index differs"))
+
+    g_events, t_events = golden["events"], trace["events"]
+    for i in range(min(len(g_events), len(t_events))):
+        g, e = g_events[i], t_events[i]
+        if g[0] != e[0] or g[2] != e[2] or g[3] != e[3]:
+            frame_index = int(min(g[0], e[0]))
+            candidates.append((frame_index, f"collision #{i} differs: golden {describe_event(g)}, got {describe_event(e)}"))
+            break
+    else:
+        if len(g_events) != len(t_events):
+            longer = g_events if len(g_events) > len(t_events) else t_events
+            extra = longer[min(len(g_events), len(t_events))]
+            candidates.append((int(extra[0]), f"collision count {len(t_events)} vs golden {len(g_events)}"))
+
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: c[0])
+
+def describe_event(event):
+    frame_index, t, ball, kind = event
+    return f"frame {int(frame_index)} t={t:.4f} ball {int(ball)} {COLLISION_KINDS[int(kind)]}"
+
+def check(names, engine="reference", pos_tol=POS_TOLERANCE, vel_tol=VEL_TOLERANCE):
+    ok = True
+    for name in names:
+        path = golden_path(name)
+        if not os.path.exists(path):
+            print(f"⚠️  {name}: no golden trace at {path}, run 'record' first")
+            ok = False
+            continue
+        golden = np.load(path)
+        trace = ENGINES[engine](reference_config(name))
+        divergence = first_divergence(golden, trace, pos_tol, vel_tol)
+        if divergence is None:
+            print(f"✅ {name}: {engine} matches golden ({len(trace['events'])} collisions)")
+        else:
+            frame_index, reason = divergence
+            t = golden["times"][min(frame_index, len(golden["times"]) - 1)]
+            print(f"❌ {name}: {engine} diverges at frame {frame_index} (t={t:.3f}s): {reason}")
+            ok = False
+    return ok
+
+def render_check(names, variants=tuple(RENDER_VARIANTS), max_frames=None):
+    """Feeds one simulation's primitives to a renderer per variant; pixels must match the
+    full redraw with the same palette setting. Prints ms/frame, full-redraw fallbacks and,
+    for palette variants, the largest channel error against plain RGB."""
+    ok = True
+    for name in names:
+        config = reference_config(name)
+        scene = Scene(config)
+        renderers = {v: make_renderer({**config, **RENDER_VARIANTS[v]}, scene.balls, scene.obstacles) for v in variants}
+        seconds = dict.fromkeys(variants, 0.0)
+        fallbacks = dict.fromkeys(variants, 0)
+        mismatches = dict.fromkeys(variants, 0)
+        palette_error = dict.fromkeys(variants, 0)
+        times = frame_times(config)[:max_frames]
+
+        previous_t = 0.0
+        for t in times:
+            update_balls(scene.balls, t - previous_t, t)
+            previous_t = t
+            handle_collisions(scene.balls, scene.obstacles, t)
+            prims = scene_primitives(scene.balls, scene.obstacles, t)
+
+            frames = {}
+            for variant, renderer in renderers.items():
+                start = time.perf_counter()
+                frames[variant] = renderer.render(prims)
+                seconds[variant] += time.perf_counter() - start
+                fallbacks[variant] += renderer.damage_area == renderer.width * renderer.height
+
+            rgb = frames.get("full")
+            for variant, frame in frames.items():
+                reference = frames.get("full+palette" if RENDER_VARIANTS[variant].get("RENDER_PALETTE") else "full")
+                if reference is not None and not np.array_equal(frame, reference):
+                    mismatches[variant] += 1
+                if rgb is not None and RENDER_VARIANTS[variant].get("RENDER_PALETTE"):
+                    error = np.abs(frame.astype(np.int16) - rgb).max()
+                    palette_error[variant] = max(palette_error[variant], int(error))
+
+        for variant in variants:
+            line = (f"{name:>16} {variant:<14} {seconds[variant] / len(times) * 1000:7.2f} ms/frame, "
+                    f"full redraws {fallbacks[variant]}/{len(times)}")
+            if RENDER_VARIANTS[variant].get("RENDER_PALETTE") and "full" in frames:
+                line += f", max error vs RGB {palette_error[variant]}"
+            if mismatches[variant]:
+                line += f"  ❌ {mismatches[variant]} frames differ"
+                ok = False
+            print(line)
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["record", "check", "render"])
+    parser.add_argument("names", nargs="*", help="reference configs (default: all)")
+    parser.add_argument("--engine", default="reference", choices=sorted(ENGINES))
+    parser.add_argument("--pos-tol", type=float, default=POS_TOLERANCE)
+    parser.add_argument("--vel-tol", type=float, default=VEL_TOLERANCE)
+    parser.add_argument("--frames", type=int, default=None, help="render: stop after this many frames")
+    parser.add_argument("--variants", nargs="+", default=list(RENDER_VARIANTS), choices=list(RENDER_VARIANTS),
+                        help="render: renderer settings to compare")
+    # Intermixed so config names may follow options, e.g. "check --engine kernel default"
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command == "render":
+        names = args.names or [*REFERENCE_CONFIGS, *RENDER_CONFIGS]
+        return 0 if render_check(names, args.variants, args.frames) else 1
+    names = args.names or list(REFERENCE_CONFIGS)
+    if args.command == "check" and args.engine == "kernel" and not args.names:
+        skipped = [name for name in names if not kernel_tracked(name)]
+        if skipped:
+            print(f"⏭️  kernel: skipping {', '.join(skipped)} (tracked with the objects, see --engine tracking)")
+        names = [name for name in names if name not in skipped]
+    if args.command == "record":
+        record(names, args.engine)
+        return 0
+    return 0 if check(names, args.engine, args.pos_tol, args.vel_tol) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
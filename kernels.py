@@ -0,0 +1,345 @@
+"""Array-based physics kernels for headless simulation.
+
+The same step logic as Ball.update, ObstacleCircle/CircleWithGap.handle_collision and
+resolve_ball_collision, written over plain float arrays. When Numba is installed the
+whole simulation loop is compiled; otherwise the kernels run as ordinary Python.
+"""
+import math
+
+import numpy as np
+
+from events import KIND_OBSTACLE_CIRCLE, KIND_CIRCLE_WITH_GAP, KIND_BALL
+from obstacle import ObstacleCircle, CircleWithGap
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+BACKEND = "numba" if NUMBA_AVAILABLE else "python"
+
+TWO_PI = 2 * np.pi
+
+@njit(cache=True)
+def add_speed(vel, i, speed_increment):
+    speed = math.sqrt(vel[i, 0] * vel[i, 0] + vel[i, 1] * vel[i, 1])
+    if speed > 0:
+        vel[i, 0] = (vel[i, 0] / speed) * (speed + speed_increment)
+        vel[i, 1] = (vel[i, 1] / speed) * (speed + speed_increment)
+
+@njit(cache=True)
+def step_ball(i, t, dt, pos, vel, radius, moving, color_index, border_index, params, width, height):
+    """Ball.update for ball i; params columns are listed in ball_params()."""
+    p = params[i]
+    speed_increment, restitution, gravity, free_time = p[0], p[1], p[2], p[4]
+
+    if p[10] and p[8] <= t <= p[9]:
+        progress = (t - p[8]) / (p[9] - p[8])
+        radius[i] = p[6] + progress * (p[7] - p[6])
+
+    moving[i] = t >= p[3]
+    if free_time > 0 and t >= free_time:
+        moving[i] = False
+    if not moving[i]:
+        return
+
+    if gravity != 0:
+        vel[i, 1] += gravity * dt
+
+    pos[i, 0] += vel[i, 0] * dt
+    pos[i, 1] += vel[i, 1] * dt
+    bounced = False
+
+    if p[5]:
+        r = radius[i]
+        if pos[i, 0] - r <= 0:
+            pos[i, 0] = r
+            vel[i, 0] *= -1
+            bounced = True
+        elif pos[i, 0] + r >= width:
+            pos[i, 0] = width - r
+            vel[i, 0] *= -1
+            bounced = True
+
+        if pos[i, 1] - r <= 0:
+            pos[i, 1] = r
+            vel[i, 1] *= -1
+            bounced = True
+        elif pos[i, 1] + r >= height:
+            pos[i, 1] = height - r
+            vel[i, 1] *= -1
+            bounced = True
+
+    if bounced:
+        if restitution == 0:
+            vel[i, 0] = 0.0
+            vel[i, 1] = 0.0
+        else:
+            vel[i, 0] *= restitution
+            vel[i, 1] *= restitution
+
+        add_speed(vel, i, speed_increment)
+
+        color_index[i] = (color_index[i] + 1) % int(p[11])
+        if p[12]:
+            border_index[i] = (border_index[i] + 1) % int(p[13])
+
+    if math.sqrt(vel[i, 0] * vel[i, 0] + vel[i, 1] * vel[i, 1]) < 1e-3:
+        vel[i, 0] = 0.0
+        vel[i, 1] = 0.0
+
+@njit(cache=True)
+def ring_collision(k, i, t, pos, vel, radius, color_index, ball_params, obstacles, active, hit):
+    """CircleWithGap.handle_collision (or ObstacleCircle's with a zero-width gap); True on bounce.
+
+    On a bounce, hit receives the contact point and impact speed."""
+    o = obstacles[k]
+    cx, cy, start_radius, end_radius, start_time, end_time = o[0], o[1], o[2], o[3], o[4], o[5]
+    gap_angle, gap_offset, rotation_speed, direction = o[6], o[7], o[8], o[9]
+
+    if not (start_time <= t <= end_time and active[k]):
+        return False
+
+    total_time = end_time - start_time
+    progress = min(max((t - start_time) / total_time, 0.0), 1.0)
+    ring_radius = start_radius + (end_radius - start_radius) * progress
+
+    dx = pos[i, 0] - cx
+    dy = pos[i, 1] - cy
+    dist = math.sqrt(dx * dx + dy * dy)
+    if dist + radius[i] <= ring_radius or dist == 0:
+        return False
+
+    if gap_angle > 0:
+        angle = math.atan2(dy, dx) % TWO_PI
+        if direction == 0:
+            gap_center = gap_offset
+        else:
+            gap_center = (gap_offset + rotation_speed * t * direction) % TWO_PI
+        gap_start = (gap_center - gap_angle / 2) % TWO_PI
+        gap_end = (gap_center + gap_angle / 2) % TWO_PI
+        in_gap = (gap_start < gap_end and gap_start <= angle <= gap_end) or \
+                 (gap_start > gap_end and (angle >= gap_start or angle <= gap_end))
+        if in_gap:
+            if o[10]:
+                active[k] = False
+            return False
+
+    nx = dx / dist
+    ny = dy / dist
+    pos[i, 0] = cx + nx * (ring_radius - radius[i])
+    pos[i, 1] = cy + ny * (ring_radius - radius[i])
+    velocity_component = vel[i, 0] * nx + vel[i, 1] * ny
+    hit[0] = cx + nx * ring_radius
+    hit[1] = cy + ny * ring_radius
+    hit[2] = abs(velocity_component)
+    restitution = ball_params[i, 1]
+    vel[i, 0] -= (1 + restitution) * velocity_component * nx
+    vel[i, 1] -= (1 + restitution) * velocity_component * ny
+
+    add_speed(vel, i, ball_params[i, 0])
+    color_index[i] = (color_index[i] + 1) % int(ball_params[i, 11])
+    return True
+
+@njit(cache=True)
+def ball_collision(a, b, pos, vel, radius, moving, ball_params, hit):
+    """resolve_ball_collision for balls a and b; hit receives the contact point and impact speed."""
+    dx = pos[a, 0] - pos[b, 0]
+    dy = pos[a, 1] - pos[b, 1]
+    dist = math.sqrt(dx * dx + dy * dy)
+    if dist == 0 or dist >= radius[a] + radius[b]:
+        return False
+
+    nx = dx / dist
+    ny = dy / dist
+    vel_along_norm = (vel[a, 0] - vel[b, 0]) * nx + (vel[a, 1] - vel[b, 1]) * ny
+    if vel_along_norm > 0:
+        return False
+
+    restitution = min(ball_params[a, 1], ball_params[b, 1])
+    impulse = -(1 + restitution) * vel_along_norm / 2
+    ix = impulse * nx
+    iy = impulse * ny
+
+    if moving[a] and moving[b]:
+        vel[a, 0] += -ix
+        vel[a, 1] += -iy
+        vel[b, 0] += ix
+        vel[b, 1] += iy
+    elif moving[a]:
+        vel[a, 0] += -2 * ix
+        vel[a, 1] += -2 * iy
+    elif moving[b]:
+        vel[b, 0] += 2 * ix
+        vel[b, 1] += 2 * iy
+
+    overlap = (radius[a] + radius[b] - dist) / 2
+    if moving[a]:
+        pos[a, 0] += nx * overlap
+        pos[a, 1] += ny * overlap
+    if moving[b]:
+        pos[b, 0] -= nx * overlap
+        pos[b, 1] -= ny * overlap
+
+    # Where the separated balls touch, as in handle_collisions
+    total = radius[a] + radius[b]
+    hit[0] = (pos[a, 0] * radius[b] + pos[b, 0] * radius[a]) / total
+    hit[1] = (pos[a, 1] * radius[b] + pos[b, 1] * radius[a]) / total
+    hit[2] = -vel_along_norm
+    return True
+
+@njit(cache=True)
+def simulate(times, pos, vel, radius, color_index, border_index, ball_params, obstacles, width, height,
+             out_pos, out_vel, out_radius, out_color, events):
+    """Runs every frame in `times`; fills the out_* arrays and returns the number of events written.
+
+    Event columns: frame, time, ball, kind, obstacle (other ball for ball hits), contact x/y, impact speed."""
+    n_balls = pos.shape[0]
+    n_obstacles = obstacles.shape[0]
+    moving = np.zeros(n_balls, dtype=np.bool_)
+    active = np.ones(n_obstacles, dtype=np.bool_)
+    hit = np.zeros(3)
+    n_events = 0
+    previous_t = 0.0
+
+    for f in range(times.shape[0]):
+        t = times[f]
+        dt = t - previous_t
+        previous_t = t
+
+        for i in range(n_balls):
+            step_ball(i, t, dt, pos, vel, radius, moving, color_index, border_index, ball_params, width, height)
+
+        for k in range(n_obstacles):
+            for i in range(n_balls):
+                if ring_collision(k, i, t, pos, vel, radius, color_index, ball_params, obstacles, active, hit):
+                    events[n_events, 0] = f
+                    events[n_events, 1] = t
+                    events[n_events, 2] = i
+                    events[n_events, 3] = obstacles[k, 11]
+                    events[n_events, 4] = k
+                    events[n_events, 5:8] = hit
+                    n_events += 1
+
+        for a in range(n_balls):
+            for b in range(a + 1, n_balls):
+                if ball_collision(a, b, pos, vel, radius, moving, ball_params, hit):
+                    for i, other in ((a, b), (b, a)):
+                        events[n_events, 0] = f
+                        events[n_events, 1] = t
+                        events[n_events, 2] = i
+                        events[n_events, 3] = KIND_BALL
+                        events[n_events, 4] = other
+                        events[n_events, 5:8] = hit
+                        n_events += 1
+
+        out_pos[f] = pos
+        out_vel[f] = vel
+        out_radius[f] = radius
+        out_color[f] = color_index
+
+    return n_events
+
+def ball_params(balls):
+    """One row per ball: speed_increment, restitution, gravity, move_start_time, free_time,
+    bounce_on_edges, grow start/end radius, grow start/end time, has_grow, n_colors,
+    border_cycle, n_border_colors."""
+    rows = []
+    for ball in balls:
+        has_grow = None not in (ball.grow_start_radius, ball.grow_end_radius,
+                                ball.grow_start_time, ball.grow_end_time)
+        rows.append((
+            ball.speed_increment,
+            ball.restitution,
+            ball.gravity_strength if ball.gravity_enabled else 0.0,
+            ball.move_start_time,
+            ball.free_time or 0.0,
+            ball.bounce_on_edges,
+            ball.grow_start_radius if has_grow else 0.0,
+            ball.grow_end_radius if has_grow else 0.0,
+            ball.grow_start_time if has_grow else 0.0,
+            ball.grow_end_time if has_grow else 0.0,
+            has_grow,
+            len(ball.colors),
+            ball.border_color_mode == "cycle",
+            len(ball.border_colors),
+        ))
+    return np.array(rows, dtype=np.float64).reshape(-1, 14)
+
+def obstacle_params(obstacles):
+    """One row per ring: center x/y, start/end radius, start/end time, gap angle, gap offset,
+    rotation speed, direction, disappear_on_gap_pass, event kind."""
+    rows = []
+    for obstacle in obstacles:
+        if isinstance(obstacle, CircleWithGap):
+            direction = {"none": 0, "clockwise": -1}.get(obstacle.rotation_mode, 1)
+            rows.append((*obstacle.center, obstacle.start_radius, obstacle.end_radius,
+                         obstacle.start_time, obstacle.end_time, obstacle.gap_angle_rad, obstacle.gap_offset_rad,
+                         obstacle.rotation_speed_rad, direction, obstacle.disappear_on_gap_pass,
+                         KIND_CIRCLE_WITH_GAP))
+        elif isinstance(obstacle, ObstacleCircle):
+            rows.append((*obstacle.center, obstacle.start_radius, obstacle.end_radius,
+                         obstacle.start_time, obstacle.end_time, 0.0, 0.0, 0.0, 0, False, KIND_OBSTACLE_CIRCLE))
+        else:
+            raise ValueError(f"No kernel for obstacle type {type(obstacle).__name__}")
+    return np.array(rows, dtype=np.float64).reshape(-1, 12)
+
+def simulate_scene(balls, obstacles, times):
+    """Simulates copies of the balls'/obstacles' current state over `times`; the objects are not modified."""
+    n_balls = len(balls)
+    pos = np.array([ball.pos for ball in balls], dtype=np.float64).reshape(-1, 2)
+    vel = np.array([ball.velocity for ball in balls], dtype=np.float64).reshape(-1, 2)
+    radius = np.array([ball.radius for ball in balls], dtype=np.float64)
+    color_index = np.array([ball.color_index for ball in balls], dtype=np.int64)
+    border_index = np.array([ball.border_color_index for ball in balls], dtype=np.int64)
+    width, height = (balls[0].video_width, balls[0].video_height) if balls else (0, 0)
+    times = np.asarray(times, dtype=np.float64)
+
+    n_frames = len(times)
+    out_pos = np.zeros((n_frames, n_balls, 2))
+    out_vel = np.zeros((n_frames, n_balls, 2))
+    out_radius = np.zeros((n_frames, n_balls))
+    out_color = np.zeros((n_frames, n_balls), dtype=np.int64)
+    # Upper bound: every ball hits every obstacle and every other ball on every frame
+    max_events = n_frames * (len(obstacles) * n_balls + n_balls * max(n_balls - 1, 0))
+    events = np.zeros((max_events, 8))
+
+    n_events = simulate(times, pos, vel, radius, color_index, border_index, ball_params(balls),
+                        obstacle_params(obstacles), float(width), float(height),
+                        out_pos, out_vel, out_radius, out_color, events)
+
+    return {
+        "times": times,
+        "positions": out_pos,
+        "velocities": out_vel,
+        "radii": out_radius,
+        "color_indices": out_color.astype(np.int32),
+        # Golden-trace layout (frame, time, ball, kind); the rest goes to EventLog via record_trace_events
+        "events": events[:n_events, :4].copy(),
+        "contacts": events[:n_events, 4:].copy(),
+    }
+
+def supports(balls, obstacles):
+    """Whether simulate_scene reproduces these objects: ring obstacles only, and distinct ball ids
+    (handle_collisions resolves each id pair once per frame)."""
+    return all(isinstance(obstacle, ObstacleCircle) for obstacle in obstacles) and \
+        len({ball.id for ball in balls}) == len(balls)
+
+def tracks(balls, obstacles):
+    """Whether the tracking pass may take its events from simulate_scene.
+
+    Only single-ball scenes: resolve_ball_collision uses np.linalg.norm/np.dot, which round
+    differently from the scalar math here, and in multi-ball scenes the difference grows
+    until bounces land on other frames (golden multi_ball drifts from frame 72 on)."""
+    return len(balls) == 1 and supports(balls, obstacles)
+
+def record_trace_events(trace, log):
+    """Appends the collision events of a simulate_scene trace to an EventLog."""
+    events, contacts = trace["events"], trace["contacts"]
+    log.extend(events[:, 1], events[:, 2], contacts[:, 0], events[:, 3], contacts[:, 1], contacts[:, 2], contacts[:, 3])
@@ -1,4 +1,4 @@
-from moviepy import AudioFileClip, concatenate_audioclips
+from moviepy import AudioFileClip, CompositeAudioClip, concatenate_audioclips
 from moviepy.audio.AudioClip import AudioArrayClip
 import numpy as np
 
@@ -9,21 +9,21 @@ def make_silence(duration, fps=44100):
 
 def merge_bounce_times(bounce_times, chunk_duration=0.1):
     """Groups nearby bounce times into continuous intervals for song-mode syncing."""
-    if not bounce_times:
+    times = np.sort(np.asarray(bounce_times, dtype=float))
+    if not len(times):
         return []
-    bounce_times.sort()
-    intervals = []
-    current_start = bounce_times[0]
-    current_end = current_start + chunk_duration
-    for t in bounce_times[1:]:
-        if t <= current_end:
-            current_end = max(current_end, t + chunk_duration)
-        else:
-            intervals.append((current_start, current_end))
-            current_start = t
-            current_end = t + chunk_duration
-    intervals.append((current_start, current_end))
-    return intervals
+    # A bounce more than one chunk after the previous one starts a new interval
+    breaks = np.nonzero(times[1:] > times[:-1] + chunk_duration)[0] + 1
+    starts = times[np.concatenate([[0], breaks])]
+    ends = times[np.concatenate([breaks - 1, [len(times) - 1]])] + chunk_duration
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def impact_gain(speeds, full_volume_speed=None):
+    """Clip volume per collision: impact speed / full_volume_speed capped at 1, or 1 everywhere when None."""
+    speeds = np.asarray(speeds, dtype=float)
+    if not full_volume_speed:
+        return np.ones_like(speeds)
+    return np.minimum(speeds / full_volume_speed, 1.0)
 
 def build_song_audio(duration, collision_intervals, song_path, volume=1.0, fps=44100):
     try:
@@ -63,17 +63,19 @@ def build_song_audio(duration, collision_intervals, song_path, volume=1.0, fps=4
     return concatenate_audioclips(segments).with_duration(duration)
 
 def build_clip_audio(duration, collision_events, fps=44100):
-    """Constructs audio from short clips played on each collision event."""
+    """Constructs audio from short clips played on each (t, path, gain) collision event."""
     if not collision_events:
         return make_silence(duration, fps)
 
     try:
         clips = []
         last_time = 0.0
-        for t, path in sorted(collision_events):
+        for t, path, gain in sorted(collision_events):
             if t > last_time:
                 clips.append(make_silence(t - last_time, fps=fps))
             clip = AudioFileClip(path)
+            if gain != 1:
+                clip = clip.with_volume_scaled(gain)
             clips.append(clip)
             last_time = t + clip.duration
         if last_time < duration:
@@ -82,3 +84,31 @@ def build_clip_audio(duration, collision_events, fps=44100):
     except Exception as e:
         print(f"Error building clip audio: {e}")
         return make_silence(duration, fps)
+
+def build_audio_track(duration, collision_intervals, collision_events, song_path, volume=1.0, fps=44100):
+    """Song-mode and clip-mode audio combined into one clip (None if there is nothing to play)."""
+    song_audio = build_song_audio(
+        duration=duration,
+        collision_intervals=collision_intervals,
+        song_path=song_path,
+        volume=volume,
+        fps=fps
+    )
+
+    clip_audio = build_clip_audio(
+        duration=duration,
+        collision_events=collision_events,
+        fps=fps
+    )
+
+    if song_audio and clip_audio:
+        return CompositeAudioClip([song_audio, clip_audio])
+    return song_audio or clip_audio
+
+def write_audio_track(path, duration, collision_intervals, collision_events, song_path, volume=1.0, fps=44100):
+    """Builds the audio track and renders it to a WAV file; returns the path, or None if there is no audio."""
+    audio = build_audio_track(duration, collision_intervals, collision_events, song_path, volume, fps)
+    if audio is None:
+        return None
+    audio.write_audiofile(path, fps=fps, codec="pcm_s16le", logger=None)
+    return path
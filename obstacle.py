@@ -1,6 +1,8 @@
 import numpy as np
 import random
-import cv2
+
+import primitives
+from events import KIND_OBSTACLE_CIRCLE, KIND_OBSTACLE_SQUARE, KIND_CIRCLE_WITH_GAP
 
 def get_color(t, base_color, color_mode):
     if color_mode == "static":
@@ -28,10 +30,14 @@ class BaseObstacle:
     def current_color(self, t):
         return get_color(t, self.base_color, self.color_mode)
 
+    def primitives(self, t):
+        """Draw calls for this obstacle at time t, in paint order (see primitives.py)."""
+        return []
+
     def draw(self, frame, t):
-        pass
+        primitives.draw_primitives(frame, self.primitives(t))
 
-    def handle_collision(self, ball, t, on_collision=None):
+    def handle_collision(self, ball, t, events=None, ball_index=0, obstacle_index=0):
         pass
 
 class ObstacleCircle(BaseObstacle):
@@ -49,19 +55,21 @@ class ObstacleCircle(BaseObstacle):
         progress = min(max((t - self.start_time) / total_time, 0), 1)
         return self.start_radius + (self.end_radius - self.start_radius) * progress
 
-    def draw(self, frame, t):
+    def primitives(self, t):
         if not self.is_active(t):
-            return
+            return []
         radius = int(self.current_radius(t))
         color = self.current_color(t)
         center_int = tuple(self.center.astype(int))
 
+        prims = []
         if self.fill_color:
-            cv2.circle(frame, center_int, radius, self.fill_color, -1)
+            prims.append(primitives.circle(center_int, radius, self.fill_color))
 
-        cv2.circle(frame, center_int, radius, color, 3)
+        prims.append(primitives.circle(center_int, radius, color, 3))
+        return prims
 
-    def handle_collision(self, ball, t, on_collision=None):
+    def handle_collision(self, ball, t, events=None, ball_index=0, obstacle_index=0):
         if not self.is_active(t):
             return
         radius = self.current_radius(t)
@@ -82,8 +90,10 @@ class ObstacleCircle(BaseObstacle):
 
             ball.next_color()
 
-            if on_collision:
-                on_collision(t, ball.id, "obstacle_circle")
+            if events is not None:
+                contact = self.center + norm * radius
+                events.record(t, ball_index, obstacle_index, KIND_OBSTACLE_CIRCLE, contact[0], contact[1],
+                              abs(velocity_component))
 
 class ObstacleSquare(BaseObstacle):
     def __init__(self, center, size, **kwargs):
@@ -91,16 +101,16 @@ class ObstacleSquare(BaseObstacle):
         self.center = np.array(center, dtype=float)
         self.size = size
 
-    def draw(self, frame, t):
+    def primitives(self, t):
         if not self.is_active(t):
-            return
+            return []
         half = self.size // 2
         top_left = (self.center - half).astype(int)
         bottom_right = (self.center + half).astype(int)
         color = self.current_color(t)
-        cv2.rectangle(frame, tuple(top_left), tuple(bottom_right), color, 3)
+        return [primitives.rect(top_left, bottom_right, color, 3)]
 
-    def handle_collision(self, ball, t, on_collision=None):
+    def handle_collision(self, ball, t, events=None, ball_index=0, obstacle_index=0):
         if not self.is_active(t):
             return
 
@@ -121,10 +131,10 @@ class ObstacleSquare(BaseObstacle):
             dx = ball.pos[0] - self.center[0]
             dy = ball.pos[1] - self.center[1]
 
-            if abs(dx) > abs(dy):
-                ball.velocity[0] *= -1
-            else:
-                ball.velocity[1] *= -1
+            axis = 0 if abs(dx) > abs(dy) else 1
+            impact_speed = abs(ball.velocity[axis])
+            contact = np.clip(ball.pos, (left, top), (right, bottom))
+            ball.velocity[axis] *= -1
 
             speed = np.linalg.norm(ball.velocity)
             if speed > 0:
@@ -136,8 +146,9 @@ class ObstacleSquare(BaseObstacle):
 
             ball.next_color()
 
-            if on_collision:
-                on_collision(t, ball.id, "obstacle_square")
+            if events is not None:
+                events.record(t, ball_index, obstacle_index, KIND_OBSTACLE_SQUARE, contact[0], contact[1],
+                              impact_speed)
 
 class CircleWithGap(ObstacleCircle):
     def __init__(self, center, start_radius, end_radius,
@@ -163,15 +174,16 @@ class CircleWithGap(ObstacleCircle):
         direction = -1 if self.rotation_mode == "clockwise" else 1
         return (self.gap_offset_rad + self.rotation_speed_rad * t * direction) % (2 * np.pi)
 
-    def draw(self, frame, t):
+    def primitives(self, t):
         if not self.is_active(t):
-            return
+            return []
         radius = int(self.current_radius(t))
         color = self.current_color(t)
         center_int = tuple(self.center.astype(int))
 
+        prims = []
         if self.fill_color:
-            cv2.circle(frame, center_int, radius, self.fill_color, -1)
+            prims.append(primitives.circle(center_int, radius, self.fill_color))
 
         gap_center = self.current_gap_angle(t)
         start_angle = np.rad2deg((gap_center + self.gap_angle_rad / 2)) % 360
@@ -180,10 +192,11 @@ class CircleWithGap(ObstacleCircle):
         gap_start_deg = end_angle % 360
         gap_end_deg = start_angle % 360
 
-        cv2.ellipse(frame, center_int, (radius, radius), 0, gap_end_deg, 360, color, 3)
-        cv2.ellipse(frame, center_int, (radius, radius), 0, 0, gap_start_deg, color, 3)
+        prims.append(primitives.ellipse(center_int, (radius, radius), 0, float(gap_end_deg), 360, color, 3))
+        prims.append(primitives.ellipse(center_int, (radius, radius), 0, 0, float(gap_start_deg), color, 3))
+        return prims
 
-    def handle_collision(self, ball, t, on_collision=None):
+    def handle_collision(self, ball, t, events=None, ball_index=0, obstacle_index=0):
         if not self.is_active(t):
             return
 
@@ -219,5 +232,7 @@ class CircleWithGap(ObstacleCircle):
 
                 ball.next_color()
 
-                if on_collision:
-                    on_collision(t, ball.id, "circle_with_gap")
+                if events is not None:
+                    contact = self.center + norm * radius
+                    events.record(t, ball_index, obstacle_index, KIND_CIRCLE_WITH_GAP, contact[0], contact[1],
+                                  abs(velocity_component))
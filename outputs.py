@@ -0,0 +1,143 @@
+import os
+
+import cv2
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import subprocess_call
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+# One full-quality video, as generate_video always produced
+DEFAULT_OUTPUTS = [
+    {"kind": "video", "suffix": "", "preset": "ultrafast"},
+]
+
+class VideoOutput:
+    def __init__(self, path, size, fps, preset="medium", crf=None, threads=2, start=0.0, duration=None):
+        self.path = path
+        self.size = tuple(size)
+        self.start = start
+        self.end = None if duration is None else start + duration
+        ffmpeg_params = ["-crf", str(crf)] if crf is not None else None
+        self.writer = FFMPEG_VideoWriter(path, self.size, fps, codec="libx264", preset=preset,
+                                         threads=threads, ffmpeg_params=ffmpeg_params)
+
+    def wants(self, t):
+        return t >= self.start and (self.end is None or t < self.end)
+
+    def write(self, frame, t):
+        self.writer.write_frame(frame)
+
+    def close(self):
+        self.writer.close()
+
+class ThumbnailSheet:
+    """Samples `count` evenly spaced frames and tiles them into a single PNG."""
+
+    def __init__(self, path, size, duration, fps, count=12, columns=4):
+        self.path = path
+        self.size = tuple(size)
+        self.columns = columns
+        n_frames = max(1, int(duration * fps))
+        self.sample_frames = set(np.linspace(0, n_frames - 1, count).round().astype(int).tolist())
+        self.fps = fps
+        self.tiles = []
+
+    def wants(self, t):
+        return int(round(t * self.fps)) in self.sample_frames
+
+    def write(self, frame, t):
+        self.tiles.append(frame.copy())
+
+    def close(self):
+        if not self.tiles:
+            return
+        width, height = self.size
+        rows = -(-len(self.tiles) // self.columns)
+        sheet = np.zeros((rows * height, self.columns * width, 3), dtype=np.uint8)
+        for i, tile in enumerate(self.tiles):
+            row, col = divmod(i, self.columns)
+            sheet[row * height:(row + 1) * height, col * width:(col + 1) * width] = tile
+        cv2.imwrite(self.path, cv2.cvtColor(sheet, cv2.COLOR_RGB2BGR))
+
+def output_path(base_path, spec):
+    ext = ".png" if spec["kind"] == "thumbnails" else ".mp4"
+    return base_path + spec.get("suffix", "") + ext
+
+def open_outputs(specs, base_path, video_size, fps, duration, temp=True):
+    """Creates a sink per output spec. With temp, sinks write to a temp file that finalize_outputs
+    moves into place (muxing audio into videos) and discard_outputs removes."""
+    sinks = []
+    for spec in specs:
+        size = spec.get("size", video_size)
+        final_path = output_path(base_path, spec)
+        root, ext = os.path.splitext(final_path)
+        path = root + ".tmp" + ext if temp else final_path
+        if spec["kind"] == "thumbnails":
+            sink = ThumbnailSheet(path, size, duration, fps,
+                                  count=spec.get("count", 12), columns=spec.get("columns", 4))
+        elif spec["kind"] in ("video", "preview"):
+            start = spec.get("start", 0.0) if spec["kind"] == "preview" else 0.0
+            clip_duration = spec.get("duration", 5.0) if spec["kind"] == "preview" else None
+            sink = VideoOutput(path, size, fps, preset=spec.get("preset", "medium"), crf=spec.get("crf"),
+                               threads=spec.get("threads", 2), start=start, duration=clip_duration)
+        else:
+            raise ValueError(f"Unknown output kind: {spec['kind']}")
+        sink.final_path = final_path
+        sinks.append(sink)
+    return sinks
+
+def render_outputs(clip, specs, base_path, fps, logger="bar"):
+    """Renders `clip` once and feeds every output; each distinct size is downscaled once per frame."""
+    sinks = open_outputs(specs, base_path, clip.size, fps, clip.duration)
+    completed = False
+    try:
+        for t, frame in clip.iter_frames(fps=fps, with_times=True, dtype="uint8", logger=logger):
+            scaled = {tuple(clip.size): frame}
+            for sink in sinks:
+                if not sink.wants(t):
+                    continue
+                if sink.size not in scaled:
+                    scaled[sink.size] = cv2.resize(frame, sink.size, interpolation=cv2.INTER_AREA)
+                sink.write(scaled[sink.size], t)
+        completed = True
+    finally:
+        for sink in sinks:
+            sink.close()
+        if not completed:
+            discard_outputs(sinks)
+    return sinks
+
+def discard_outputs(sinks):
+    """Removes the temp files of sinks that were not finalized (after a failed render or mux)."""
+    for sink in sinks:
+        if sink.path != sink.final_path and os.path.exists(sink.path):
+            os.remove(sink.path)
+
+def mux_audio(video_path, audio_path, output_file, start=0.0, duration=None):
+    """Copies the video stream and encodes the (optionally trimmed) WAV to AAC alongside it."""
+    cmd = [FFMPEG_BINARY, "-y", "-i", video_path]
+    if start:
+        cmd += ["-ss", "%.03f" % start]
+    if duration is not None:
+        cmd += ["-t", "%.03f" % duration]
+    cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", "aac",
+            "-shortest", output_file]
+    subprocess_call(cmd, logger=None)
+
+def finalize_outputs(sinks, audio_path):
+    """Moves temp files to their final names, muxing the audio track into videos when there is one.
+
+    Videos go first, so a failed mux leaves no other output in place either."""
+    for sink in sinks:
+        if not isinstance(sink, VideoOutput) or sink.path == sink.final_path:
+            continue
+        if audio_path:
+            duration = None if sink.end is None else sink.end - sink.start
+            mux_audio(sink.path, audio_path, sink.final_path, start=sink.start, duration=duration)
+            os.remove(sink.path)
+        else:
+            os.replace(sink.path, sink.final_path)
+    for sink in sinks:
+        # A sheet that sampled no frames wrote nothing
+        if not isinstance(sink, VideoOutput) and sink.path != sink.final_path and os.path.exists(sink.path):
+            os.replace(sink.path, sink.final_path)
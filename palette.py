@@ -0,0 +1,99 @@
+"""Per-scene color palette for the indexed (single-channel) render mode.
+
+Everything a scene draws comes from a few small color lists, so frames can be drawn as
+uint8 slot indices and expanded to RGB through a lookup table only at output. Slot 0 is
+the background, then every color the scene can produce exactly, then a few quantized
+fade levels per trail color. Fade steps between levels snap to the nearest level;
+other unregistered colors (random/time obstacle colors) take a free slot while any
+remain and the nearest slot afterwards.
+"""
+import cv2
+import numpy as np
+
+PALETTE_SIZE = 256
+# Slots left free for colors that only show up while rendering
+SPARE_SLOTS = 32
+MAX_FADE_LEVELS = 16
+
+class Palette:
+    def __init__(self, background_color, size=PALETTE_SIZE):
+        self.size = size
+        self.lut = np.zeros((size, 3), dtype=np.uint8)
+        self.slots = {}
+        self.count = 0
+        # Unregistered colors this close (RGB distance) to a slot reuse it instead of taking a new one
+        self.tolerance = 0
+        self.add(background_color)
+
+    def add(self, color):
+        """Slot for color, assigning a new one if needed; None when the palette is full."""
+        color = tuple(int(c) for c in color)
+        slot = self.slots.get(color)
+        if slot is None and self.count < self.size:
+            slot = self.count
+            self.lut[slot] = color
+            self.slots[color] = slot
+            self.count += 1
+        return slot
+
+    def index(self, color):
+        """Slot to draw color with: the nearest within tolerance, else a new one, else the nearest."""
+        slot = self.slots.get(color)
+        if slot is not None:
+            return slot
+        distances = ((self.lut[:self.count].astype(np.int32) - color) ** 2).sum(axis=1)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.tolerance ** 2:
+            slot = self.add(color)
+        if slot is None:
+            slot = nearest
+            # Remember the mapping; the LUT itself only holds exact registered colors
+            self.slots[tuple(color)] = slot
+        return slot
+
+    def reserve_fades(self, colors, levels):
+        """Registers colors scaled by k/levels for k = 1..levels-1, the way faded trails draw them.
+
+        Fade steps in between snap to the nearest level rather than using up free slots."""
+        for color in colors:
+            base = np.array(color, dtype=float)
+            for k in range(1, levels):
+                self.add((base * k / levels).astype(np.uint8))
+            self.tolerance = max(self.tolerance, np.linalg.norm(base) / levels / 2 + 1)
+
+    def expand(self, indices, out=None):
+        """RGB uint8 image for a 2-D index buffer, written to out when given."""
+        # cv2's per-channel LUT on a gray->RGB copy beats numpy fancy indexing ~3x
+        if indices.flags.c_contiguous and (out is None or out.flags.c_contiguous):
+            out = cv2.cvtColor(indices, cv2.COLOR_GRAY2RGB, dst=out)
+            return cv2.LUT(out, self.lut.reshape(-1, 1, 3), dst=out)
+        rgb = self.expand(np.ascontiguousarray(indices))
+        if out is None:
+            return rgb
+        out[:] = rgb
+        return out
+
+def scene_palette(background_color, balls, obstacles, size=PALETTE_SIZE):
+    """Palette holding every color the given balls and obstacles can draw."""
+    palette = Palette(background_color, size)
+    fade_bases = []
+    for ball in balls:
+        for color in list(ball.colors) + list(ball.border_colors) + [ball.border_color, ball.frozen_color]:
+            if color is not None:
+                palette.add(color)
+        if ball.trail_enabled and not ball.trail_lock_appearance:
+            trail_colors = ball.colors + [ball.frozen_color] if ball.trail_color_mode == "fade" else [ball.trail_color]
+            fade_bases.extend(tuple(c) for c in trail_colors)
+            palette.add(ball.trail_color)
+    for obstacle in obstacles:
+        palette.add(obstacle.base_color)
+        if getattr(obstacle, "fill_color", None):
+            palette.add(obstacle.fill_color)
+
+    fade_bases = list(dict.fromkeys(fade_bases))
+    if fade_bases:
+        free = palette.size - palette.count - SPARE_SLOTS
+        levels = min(MAX_FADE_LEVELS, free // len(fade_bases) + 1)
+        if levels > 1:
+            palette.reserve_fades(fade_bases, levels)
+    return palette
@@ -0,0 +1,101 @@
+"""Hashable draw calls shared by balls, obstacles and the renderers.
+
+    ("circle", center, radius, color, thickness)
+    ("ellipse", center, axes, angle, start_angle, end_angle, color, thickness)
+    ("rect", top_left, bottom_right, color, thickness)
+
+Coordinates are ints, colors are tuples, so two frames' primitives can be compared
+directly to find what changed.
+"""
+import cv2
+import numpy as np
+
+def circle(center, radius, color, thickness=-1):
+    return ("circle", (int(center[0]), int(center[1])), int(radius), tuple(color), thickness)
+
+def ellipse(center, axes, angle, start_angle, end_angle, color, thickness):
+    # cv2 rounds angles to whole degrees anyway; rounding here lets unchanged arcs compare equal
+    return ("ellipse", (int(center[0]), int(center[1])), (int(axes[0]), int(axes[1])), int(round(angle)),
+            int(round(start_angle)), int(round(end_angle)), tuple(color), thickness)
+
+def rect(top_left, bottom_right, color, thickness):
+    return ("rect", (int(top_left[0]), int(top_left[1])), (int(bottom_right[0]), int(bottom_right[1])),
+            tuple(color), thickness)
+
+def _shift(point, offset):
+    return (point[0] - offset[0], point[1] - offset[1])
+
+def draw_primitive(frame, prim, offset=(0, 0), palette=None):
+    """Paints prim onto frame, whose top-left pixel sits at `offset` in full-frame coordinates.
+
+    With a palette, frame is a single-channel index buffer and colors become palette slots."""
+    kind = prim[0]
+    if kind == "circle":
+        _, center, radius, color, thickness = prim
+        if palette is not None:
+            color = palette.index(color)
+        cv2.circle(frame, _shift(center, offset), radius, color, thickness)
+    elif kind == "ellipse":
+        _, center, axes, angle, start_angle, end_angle, color, thickness = prim
+        if palette is not None:
+            color = palette.index(color)
+        cv2.ellipse(frame, _shift(center, offset), axes, angle, start_angle, end_angle, color, thickness)
+    elif kind == "rect":
+        _, top_left, bottom_right, color, thickness = prim
+        if palette is not None:
+            color = palette.index(color)
+        cv2.rectangle(frame, _shift(top_left, offset), _shift(bottom_right, offset), color, thickness)
+
+def draw_primitives(frame, prims, offset=(0, 0), palette=None):
+    """Paints prims in order; returns an estimate of the pixels written."""
+    pixels = 0
+    for prim in prims:
+        draw_primitive(frame, prim, offset, palette)
+        pixels += primitive_area(prim)
+    return int(pixels)
+
+def primitive_area(prim):
+    if prim[0] == "circle":
+        radius, thickness = prim[2], prim[4]
+        return np.pi * radius ** 2 if thickness < 0 else 2 * np.pi * radius * thickness
+    if prim[0] == "ellipse":
+        axes, start_angle, end_angle, thickness = prim[2], prim[4], prim[5], prim[7]
+        return np.pi * (axes[0] + axes[1]) * thickness * abs(end_angle - start_angle) / 360
+    (x0, y0), (x1, y1) = prim[1], prim[2]
+    return abs(x1 - x0) * abs(y1 - y0) if prim[4] < 0 else 2 * (abs(x1 - x0) + abs(y1 - y0)) * prim[4]
+
+def _pad(thickness):
+    # Thick outlines spread half their width outside the shape; +2 covers cv2's rounding
+    return (max(thickness, 1) // 2) + 2
+
+def primitive_bounds(prim):
+    """Conservative (x0, y0, x1, y1) box, x1/y1 exclusive, of the pixels prim can touch."""
+    kind = prim[0]
+    if kind == "circle":
+        (x, y), radius, thickness = prim[1], prim[2], prim[4]
+        pad = _pad(thickness)
+        return (x - radius - pad, y - radius - pad, x + radius + pad + 1, y + radius + pad + 1)
+    if kind == "ellipse":
+        (x, y), (ax, ay), thickness = prim[1], prim[2], prim[7]
+        pad = _pad(thickness)
+        return (x - ax - pad, y - ay - pad, x + ax + pad + 1, y + ay + pad + 1)
+    (x0, y0), (x1, y1), thickness = prim[1], prim[2], prim[4]
+    pad = _pad(thickness)
+    return (min(x0, x1) - pad, min(y0, y1) - pad, max(x0, x1) + pad + 1, max(y0, y1) + pad + 1)
+
+def arc_chunk_bounds(center, axes, start_angle, end_angle, thickness, chunk_deg):
+    """Boxes around consecutive chunk_deg-wide pieces of an (unrotated) ellipse arc, as an (n, 4) int array.
+
+    A piece's extremes are its end points plus any axis crossing in between; cv2's polyline
+    vertices sit on the arc, so its chords stay inside the same box."""
+    starts = np.arange(start_angle, max(end_angle, start_angle + 1), chunk_deg, dtype=float)
+    ends = np.minimum(starts + chunk_deg, end_angle)
+    # Pieces narrower than 90 degrees contain at most one axis crossing
+    crossings = np.ceil(starts / 90) * 90
+    crossings = np.where(crossings < ends, crossings, starts)
+    angles = np.deg2rad(np.stack([starts, ends, crossings]))
+    xs = center[0] + axes[0] * np.cos(angles)
+    ys = center[1] + axes[1] * np.sin(angles)
+    pad = _pad(thickness)
+    return np.stack([np.floor(xs.min(0)) - pad, np.floor(ys.min(0)) - pad,
+                     np.ceil(xs.max(0)) + pad + 1, np.ceil(ys.max(0)) + pad + 1], axis=1).astype(int)
@@ -0,0 +1,136 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+class FrameProfiler:
+    """Opt-in per-frame timing and counters for a single render pass."""
+
+    def __init__(self, fps, name="render"):
+        self.fps = fps
+        self.name = name
+        self.frames = []
+        self.counters = {}
+        self.trace_events = []
+        self._current = None
+        self._frame_start = None
+        self._last_frame_end = None
+        self._origin = time.perf_counter()
+
+    def _us(self, t):
+        return (t - self._origin) * 1e6
+
+    def begin_frame(self, t):
+        now = time.perf_counter()
+        # Whatever happened between two make_frame calls is moviepy compositing + ffmpeg encoding
+        if self._last_frame_end is not None:
+            self._add_span("encoder_wait", self._last_frame_end, now)
+        self._frame_start = now
+        self._current = {"index": len(self.frames), "t": t, "sections": {}, "counters": {}}
+        if self._last_frame_end is not None:
+            self._current["sections"]["encoder_wait"] = now - self._last_frame_end
+
+    def end_frame(self):
+        now = time.perf_counter()
+        self._current["total"] = now - self._frame_start
+        self._add_span("frame", self._frame_start, now, args={"index": self._current["index"], "t": self._current["t"]})
+        self.frames.append(self._current)
+        self._current = None
+        self._last_frame_end = now
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            if self._current is not None:
+                sections = self._current["sections"]
+                sections[name] = sections.get(name, 0.0) + (end - start)
+            self._add_span(name, start, end)
+
+    def add(self, name, seconds):
+        """Adds time measured elsewhere (e.g. inside the renderer) to a section of the current frame."""
+        if self._current is not None:
+            sections = self._current["sections"]
+            sections[name] = sections.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        if self._current is not None:
+            counters = self._current["counters"]
+            counters[name] = counters.get(name, 0) + n
+
+    def _add_span(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "ts": self._us(start), "dur": (end - start) * 1e6,
+                 "pid": os.getpid(), "tid": 0 if name == "frame" else 1}
+        if args:
+            event["args"] = args
+        self.trace_events.append(event)
+
+    def histograms(self):
+        names = set()
+        for frame in self.frames:
+            names.update(frame["sections"])
+        result = {}
+        for name in sorted(names) + ["total"]:
+            if name == "total":
+                values = np.array([f["total"] for f in self.frames])
+            else:
+                values = np.array([f["sections"].get(name, 0.0) for f in self.frames])
+            if len(values) == 0:
+                continue
+            result[name] = {
+                "p50_ms": float(np.percentile(values, 50) * 1000),
+                "p95_ms": float(np.percentile(values, 95) * 1000),
+                "max_ms": float(values.max() * 1000),
+                "sum_s": float(values.sum()),
+            }
+        return result
+
+    def slow_frames(self, top=10):
+        """Frames whose make_frame time exceeded the real-time budget, slowest first."""
+        budget = 1.0 / self.fps
+        over = [f for f in self.frames if f["total"] > budget]
+        over.sort(key=lambda f: f["total"], reverse=True)
+        return [{"index": f["index"], "t": f["t"], "total_ms": f["total"] * 1000,
+                 "sections_ms": {k: v * 1000 for k, v in f["sections"].items()},
+                 "counters": f["counters"]} for f in over[:top]]
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "frames": len(self.frames),
+            "budget_ms": 1000.0 / self.fps,
+            "frames_over_budget": sum(1 for f in self.frames if f["total"] > 1.0 / self.fps),
+            "counters": dict(self.counters),
+            "histograms": self.histograms(),
+            "slowest_frames": self.slow_frames(),
+        }
+
+    def export(self, path_prefix):
+        """Writes <prefix>.json (summary + per-frame timeline) and <prefix>.trace.json (chrome://tracing)."""
+        directory = os.path.dirname(path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        report = self.summary()
+        report["timeline"] = [{"index": f["index"], "t": f["t"], "total_ms": f["total"] * 1000,
+                               "sections_ms": {k: v * 1000 for k, v in f["sections"].items()},
+                               "counters": f["counters"]} for f in self.frames]
+        with open(path_prefix + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        with open(path_prefix + ".trace.json", "w") as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"⏱️  {self.name}: {summary['frames']} frames, "
+              f"{summary['frames_over_budget']} over {summary['budget_ms']:.1f} ms budget")
+        for name, h in summary["histograms"].items():
+            print(f"   {name:<19} p50 {h['p50_ms']:7.2f} ms  p95 {h['p95_ms']:7.2f} ms  max {h['max_ms']:7.2f} ms")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"   {name:<19} {value}")
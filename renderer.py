@@ -0,0 +1,360 @@
+"""Frame rasterizers fed with the per-frame primitive lists from Ball/obstacle .primitives(t).
+
+FullRenderer clears and redraws the whole frame every time. DirtyRectRenderer keeps the
+previous frame and only repaints the rectangles around primitives that appeared or
+disappeared since the last call, so its cost follows on-screen motion instead of frame size.
+Both produce identical pixels.
+
+Given a Palette, either one draws slot indices into a single-channel canvas (a third of
+the bytes to fill) and expands it to RGB through the palette's LUT on the way out, only
+where the slots changed since the previous frame.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+import primitives
+from palette import scene_palette
+
+# Above this share of the frame, one full redraw is cheaper than many small ones
+FULL_REDRAW_FRACTION = 0.5
+# Ring and arc damage is split in spans this wide so it covers a band, not the ring's box
+ARC_CHUNK_DEG = 10
+# Damage is snapped to a grid of square tiles this size and coalesced into rects
+TILE_SIZE = 32
+# After consecutive fallbacks, redraw up to this many frames without diffing before trying again
+MAX_FALLBACK_SKIP = 16
+# Palette mode expands the whole frame at once when more than this share of its tiles changed
+FULL_EXPAND_FRACTION = 0.5
+
+def make_renderer(config, balls=(), obstacles=()):
+    """Renderer for config["RENDER_MODE"]: "full" (default) or "dirty".
+
+    With config["RENDER_PALETTE"], it draws indexed with a palette built from balls and obstacles."""
+    palette = None
+    if config.get("RENDER_PALETTE"):
+        palette = scene_palette(config["BACKGROUND_COLOR"], balls, obstacles)
+    mode = config.get("RENDER_MODE", "full")
+    if mode == "full":
+        return FullRenderer(config["VIDEO_SIZE"], config["BACKGROUND_COLOR"], palette)
+    if mode == "dirty":
+        return DirtyRectRenderer(config["VIDEO_SIZE"], config["BACKGROUND_COLOR"], palette=palette)
+    raise ValueError(f"Unknown RENDER_MODE: {mode!r}")
+
+def background_frame(video_size, background_color, palette=None):
+    # Copying from this is several times faster than np.full's per-pixel broadcast of a color
+    if palette is not None:
+        return np.full((video_size[1], video_size[0]), palette.index(tuple(background_color)), dtype=np.uint8)
+    return np.full((video_size[1], video_size[0], 3), background_color, dtype=np.uint8)
+
+def changed_tiles(canvas, previous, tile_size=TILE_SIZE):
+    """Boolean grid of the tile_size tiles where two index buffers differ."""
+    height, width = canvas.shape
+    if width % 8 == 0 and canvas.flags.c_contiguous and previous.flags.c_contiguous:
+        # Eight slots per comparison; tile edges fall on word boundaries since tile_size % 8 == 0
+        changed = canvas.view(np.uint64) != previous.view(np.uint64)
+        tile_columns = tile_size // 8
+    else:
+        changed = canvas != previous
+        tile_columns = tile_size
+    if height % tile_size == 0:
+        changed = changed.reshape(height // tile_size, tile_size, -1).any(axis=1)
+    else:
+        changed = np.logical_or.reduceat(changed, np.arange(0, height, tile_size), axis=0)
+    return np.logical_or.reduceat(changed, np.arange(0, changed.shape[1], tile_columns), axis=1)
+
+class FullRenderer:
+    def __init__(self, video_size, background_color, palette=None):
+        self.width, self.height = video_size
+        self.palette = palette
+        self.background = background_frame(video_size, background_color, palette)
+        # What gets drawn into (palette slots when indexed) and the RGB frame handed out
+        self.canvas = None
+        self.frame = None
+        # Palette mode draws each frame into the spare canvas, then swaps it with the shown one
+        self._spare = None
+        self.damage = []
+        # Approximate pixels painted by the last render() call
+        self.pixels_filled = 0
+        # Seconds the last render() spent drawing prims[:split] and prims[split:]
+        self.draw_seconds = [0.0, 0.0]
+
+    @property
+    def damage_area(self):
+        return self.width * self.height
+
+    def render(self, prims, split=None):
+        """Returns the frame with prims painted in order over the background.
+
+        Drawing prims[:split] and prims[split:] is timed separately into draw_seconds.
+        Without a palette this is a new array each call; with one, it is a persistent RGB
+        frame reused by the next call (copy it if it has to outlive that)."""
+        self.draw_seconds = [0.0, 0.0]
+        self._full_redraw(prims, len(prims) if split is None else split)
+        return self.frame
+
+    def _draw(self, canvas, prims, split, offset=(0, 0)):
+        for group, part in enumerate((prims[:split], prims[split:])):
+            start = time.perf_counter()
+            self.pixels_filled += primitives.draw_primitives(canvas, part, offset, self.palette)
+            self.draw_seconds[group] += time.perf_counter() - start
+
+    def _full_redraw(self, prims, split):
+        self.pixels_filled = 0
+        if self.palette is None:
+            self.canvas = self.frame = self.background.copy()
+            self._draw(self.canvas, prims, split)
+        else:
+            canvas = self._spare if self._spare is not None else np.empty_like(self.background)
+            np.copyto(canvas, self.background)
+            self._draw(canvas, prims, split)
+            self._expand_changes(canvas)
+            self._spare, self.canvas = self.canvas, canvas
+        self.damage = [(0, 0, self.width, self.height)]
+
+    def _expand_changes(self, canvas):
+        """Brings the RGB frame from self.canvas to canvas, expanding only the tiles whose slots changed.
+
+        Most of a redrawn frame is identical to the last one, and the LUT pass costs more
+        than the comparison; unchanged frames skip it entirely."""
+        if self.frame is None:
+            self.frame = self.palette.expand(canvas)
+            return
+        tiles = changed_tiles(canvas, self.canvas)
+        if tiles.mean() > FULL_EXPAND_FRACTION:
+            self.palette.expand(canvas, out=self.frame)
+            return
+        for x0, y0, x1, y1 in tile_rects(tiles, TILE_SIZE, self.width, self.height):
+            self.palette.expand(canvas[y0:y1, x0:x1], out=self.frame[y0:y1, x0:x1])
+
+def _arc_step(radius):
+    # cv2.ellipse tessellates outlines in steps of this many degrees, anchored at the start angle
+    return 90 if radius < 3 else 30 if radius < 10 else 18 if radius < 15 else 5
+
+def _is_outline(prim):
+    return prim[0] == "ellipse" or prim[0] == "circle" and prim[4] > 0
+
+def _is_round_arc(prim):
+    return prim[0] == "ellipse" and prim[2][0] == prim[2][1] and prim[3] % 360 == 0
+
+def _clip_margin(prim):
+    """Extra pixels around a redraw region so no segment of outline prim crossing it gets clipped.
+
+    Thick outlines are polylines whose Bresenham edges start from the clipped endpoint, so a
+    segment cut by the buffer border can land on different pixels than in the full frame."""
+    radius = max(prim[2]) if prim[0] == "ellipse" else prim[2]
+    return int(np.ceil(radius * np.deg2rad(_arc_step(radius)))) + prim[-1] + 2
+
+def _rect_area(rect):
+    return max(0, rect[2] - rect[0]) * max(0, rect[3] - rect[1])
+
+def tile_rects(tiles, tile_size, width, height):
+    """Coalesces a boolean tile grid into rects: runs per tile row, stacked while they repeat."""
+    rects = []
+    open_runs = {}
+    padded = np.zeros(tiles.shape[1] + 2, dtype=np.int8)
+    previous_row = -2
+    for ty in np.flatnonzero(tiles.any(axis=1)).tolist():
+        if ty != previous_row + 1:
+            rects.extend((tx0, ty0, tx1, previous_row + 1) for (tx0, tx1), ty0 in open_runs.items())
+            open_runs = {}
+        padded[1:-1] = tiles[ty]
+        edges = np.flatnonzero(np.diff(padded)).tolist()
+        runs = {run: open_runs.pop(run, ty) for run in zip(edges[::2], edges[1::2])}
+        rects.extend((tx0, ty0, tx1, ty) for (tx0, tx1), ty0 in open_runs.items())
+        open_runs = runs
+        previous_row = ty
+    rects.extend((tx0, ty0, tx1, previous_row + 1) for (tx0, tx1), ty0 in open_runs.items())
+    return [(tx0 * tile_size, ty0 * tile_size, min(tx1 * tile_size, width), min(ty1 * tile_size, height))
+            for tx0, ty0, tx1, ty1 in rects]
+
+def _touches_outline(prim, rect):
+    """Whether rect reaches the band of a circle/ellipse outline (its inside is never painted)."""
+    if prim[0] == "ellipse":
+        (cx, cy), axes, thickness = prim[1], prim[2], prim[7]
+        outer, inner = max(axes), min(axes)
+    else:
+        (cx, cy), outer, thickness = prim[1], prim[2], prim[4]
+        inner = outer
+    pad = thickness // 2 + 2
+    x0, y0, x1, y1 = rect
+    near_x = max(x0 - cx, 0, cx - (x1 - 1))
+    near_y = max(y0 - cy, 0, cy - (y1 - 1))
+    far_x = max(abs(x0 - cx), abs(x1 - 1 - cx))
+    far_y = max(abs(y0 - cy), abs(y1 - 1 - cy))
+    return near_x * near_x + near_y * near_y <= (outer + pad) ** 2 and \
+        far_x * far_x + far_y * far_y >= max(inner - pad, 0) ** 2
+
+def _covers(prim, rect):
+    """Whether prim is a filled circle painting every pixel of rect (so nothing under it shows)."""
+    if prim[0] != "circle" or prim[4] >= 0:
+        return False
+    (cx, cy), radius = prim[1], prim[2] - 1
+    x0, y0, x1, y1 = rect
+    far_x = max(abs(x0 - cx), abs(x1 - 1 - cx))
+    far_y = max(abs(y0 - cy), abs(y1 - 1 - cy))
+    return far_x * far_x + far_y * far_y <= radius * radius
+
+class DirtyRectRenderer(FullRenderer):
+    """Repaints only what changed into a persistent frame.
+
+    The returned frame is reused by the next render() call; copy it if it has to outlive
+    that. `damage` lists the (x0, y0, x1, y1) rectangles repainted by the last call.
+    """
+
+    def __init__(self, video_size, background_color, full_redraw_fraction=None, palette=None):
+        super().__init__(video_size, background_color, palette)
+        self.full_redraw_area = (full_redraw_fraction or FULL_REDRAW_FRACTION) * self.width * self.height
+        self.previous = Counter()
+        # Full redraws left before diffing again, and the current back-off length
+        self.skip = 0
+        self.backoff = 0
+        self._bounds = {}
+        self._tiles = np.zeros((-(-self.height // TILE_SIZE), -(-self.width // TILE_SIZE)), dtype=bool)
+
+    @property
+    def damage_area(self):
+        return sum(_rect_area(rect) for rect in self.damage)
+
+    def bounds(self, prim):
+        bounds = self._bounds.get(prim)
+        if bounds is None:
+            if len(self._bounds) > 65536:
+                self._bounds.clear()
+            bounds = self._bounds[prim] = primitives.primitive_bounds(prim)
+        return bounds
+
+    def _arc_damage(self, center, radius, start_angle, end_angle, thickness):
+        return primitives.arc_chunk_bounds(center, (radius, radius), start_angle, end_angle,
+                                           thickness, ARC_CHUNK_DEG).tolist()
+
+    def _band_damage(self, center, inner, outer, thickness):
+        """Damage for a circle edge of `thickness` anywhere between radii inner and outer."""
+        middle = (inner + outer) // 2
+        return self._arc_damage(center, middle, 0, 360, (outer - middle + 1) * 2 + thickness)
+
+    def _prim_damage(self, prim):
+        if _is_round_arc(prim):
+            return self._arc_damage(prim[1], prim[2][0], *sorted(prim[4:6]), prim[7])
+        if prim[0] == "circle" and prim[4] > 0:
+            return self._band_damage(prim[1], prim[2], prim[2], prim[4])
+        return [self.bounds(prim)]
+
+    def _changed_damage(self, old, new):
+        """Damage between two frames' versions of one shape that differ in size or arc span only."""
+        if old[0] == "circle":
+            if max(old[2], new[2]) <= TILE_SIZE:
+                return [self.bounds(old), self.bounds(new)]
+            # Only the radius changed: repaint the band between the two, not the whole disc
+            inner, outer = sorted((old[2], new[2]))
+            return self._band_damage(old[1], inner, outer, max(old[4], 1))
+        old_start, old_end = sorted(old[4:6])
+        new_start, new_end = sorted(new[4:6])
+        if old[2] != new[2]:
+            return self._prim_damage(old) + self._prim_damage(new)
+        if old_start == new_start:
+            # Only the end moved: pixels change from the last tessellation step before it onward
+            start = max(min(old_end, new_end) - _arc_step(old[2][0]), old_start)
+            return self._arc_damage(old[1], old[2][0], start, max(old_end, new_end), old[7])
+        # A moved start re-tessellates the whole arc
+        return self._arc_damage(old[1], old[2][0], min(old_start, new_start), max(old_end, new_end), old[7])
+
+    @staticmethod
+    def _shape_key(prim):
+        # Everything but the radius (circles) or the span (round, unrotated arcs)
+        if prim[0] == "circle":
+            return prim[0], prim[1], prim[3], prim[4]
+        if _is_round_arc(prim):
+            return prim[0], prim[1], prim[6], prim[7]
+        return None
+
+    def find_damage(self, removed, added):
+        rects = []
+        unpaired = {}
+        for prim in added.elements():
+            key = self._shape_key(prim)
+            if key is None:
+                rects.extend(self._prim_damage(prim))
+            else:
+                unpaired.setdefault(key, []).append(prim)
+        for prim in removed.elements():
+            partners = unpaired.get(self._shape_key(prim))
+            if partners:
+                rects.extend(self._changed_damage(prim, partners.pop()))
+            else:
+                rects.extend(self._prim_damage(prim))
+        for partners in unpaired.values():
+            for prim in partners:
+                rects.extend(self._prim_damage(prim))
+
+        tiles = self._tiles
+        tiles[:] = False
+        for x0, y0, x1, y1 in rects:
+            x0, y0 = max(x0, 0) // TILE_SIZE, max(y0, 0) // TILE_SIZE
+            x1, y1 = -(-min(x1, self.width) // TILE_SIZE), -(-min(y1, self.height) // TILE_SIZE)
+            if x1 > x0 and y1 > y0:
+                tiles[y0:y1, x0:x1] = True
+        return tile_rects(tiles, TILE_SIZE, self.width, self.height)
+
+    def _repaint(self, rect, prims, split):
+        x0, y0, x1, y1 = rect
+        margin = max((_clip_margin(prim) for prim in prims if _is_outline(prim)), default=0)
+        if margin == 0:
+            view = self.canvas[y0:y1, x0:x1]
+            view[:] = self.background[y0:y1, x0:x1]
+            self._draw(view, prims, split, (x0, y0))
+        else:
+            # Draw into a padded scratch buffer and keep only the inside
+            sx0, sy0 = max(x0 - margin, 0), max(y0 - margin, 0)
+            sx1, sy1 = min(x1 + margin, self.width), min(y1 + margin, self.height)
+            scratch = self.background[sy0:sy1, sx0:sx1].copy()
+            self._draw(scratch, prims, split, (sx0, sy0))
+            self.canvas[y0:y1, x0:x1] = scratch[y0 - sy0:y1 - sy0, x0 - sx0:x1 - sx0]
+        if self.palette is not None:
+            self.palette.expand(self.canvas[y0:y1, x0:x1], out=self.frame[y0:y1, x0:x1])
+
+    def _hits(self, prims, damage):
+        """(rects x prims) matrix of which primitive boxes overlap which damage rect."""
+        boxes = np.array([self.bounds(prim) for prim in prims]).reshape(-1, 4)
+        rects = np.array(damage).reshape(-1, 4)
+        return (boxes[None, :, 0] < rects[:, None, 2]) & (rects[:, None, 0] < boxes[None, :, 2]) & \
+               (boxes[None, :, 1] < rects[:, None, 3]) & (rects[:, None, 1] < boxes[None, :, 3])
+
+    def render(self, prims, split=None):
+        self.draw_seconds = [0.0, 0.0]
+        split = len(prims) if split is None else split
+        if self.canvas is None or self.skip:
+            # Scenes that keep falling back (a big moving ball, a ring fill under every rect) would
+            # pay for the diff on every frame only to redraw it all, so back off exponentially
+            self.skip = max(self.skip - 1, 0)
+            self._full_redraw(prims, split)
+            # Only the frame before the next diff needs its primitives counted
+            self.previous = None if self.skip else Counter(prims)
+            return self.frame
+
+        current = Counter(prims)
+        damage = self.find_damage(self.previous - current, current - self.previous)
+        hits = self._hits(prims, damage)
+        # One full pass wins once the regions cover much of the frame or would redraw
+        # more primitives than the frame holds
+        if sum(_rect_area(rect) for rect in damage) > self.full_redraw_area or hits.sum() > len(prims):
+            self._full_redraw(prims, split)
+            self.backoff = min(self.backoff * 2 or 1, MAX_FALLBACK_SKIP)
+            self.skip = self.backoff
+        else:
+            self.backoff = 0
+            self.pixels_filled = 0
+            for rect, row in zip(damage, hits):
+                touching = [i for i in np.flatnonzero(row).tolist()
+                            if not _is_outline(prims[i]) or _touches_outline(prims[i], rect)]
+                # Skip whatever the topmost covering disc hides (dense trails stack hundreds)
+                for first in range(len(touching) - 1, 0, -1):
+                    if _covers(prims[touching[first]], rect):
+                        touching = touching[first:]
+                        break
+                self._repaint(rect, [prims[i] for i in touching], bisect_left(touching, split))
+            self.damage = damage
+        self.previous = current
+        return self.frame
@@ -0,0 +1,336 @@
+"""Real-time streaming output.
+
+Renders a scene at the wall-clock pace of CONFIG["FPS"] and pipes raw frames plus
+incrementally synthesized audio into an ffmpeg process that sends them to
+CONFIG["STREAM_TARGET"] (udp://, rtmp://, srt:// or a named pipe path).
+"""
+import os
+import queue
+import subprocess
+import threading
+import time
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from BallPlayingMusicFill import Scene, update_balls, handle_collisions, audio_events, scene_primitives
+from renderer import make_renderer
+from text_cache import render_text_rgba
+
+STREAM_DEFAULTS = {
+    "STREAM_QUEUE_SIZE": 30,
+    "STREAM_POLICY": "duplicate",  # "duplicate" the last frame or "drop" the tick when rendering falls behind
+    "STREAM_LOOP": True,           # start a fresh scene every VIDEO_DURATION seconds
+    "STREAM_PRESET": "veryfast",
+    "STREAM_BITRATE": "6M",
+    "STREAM_METRICS_INTERVAL": 10,
+}
+
+# Same per-bounce window as merge_bounce_times (chunk) + build_song_audio (buffer)
+SONG_CHUNK = 0.1 + 0.1
+
+class StreamingAudio:
+    """Synthesizes audio block by block from bounce events as they happen.
+
+    Song-mode bounces keep the song playing for SONG_CHUNK seconds past the last bounce and
+    advance a song cursor only while playing, like build_song_audio does offline. Clip-mode
+    events start a voice that is mixed in until the clip ends."""
+
+    def __init__(self, song_path, fps):
+        self.fps = fps
+        self.song = self._load(song_path) if song_path else np.zeros((0, 2), dtype=np.float32)
+        self.song_cursor = 0
+        self.play_until = 0.0
+        self.voices = []
+        self.clips = {}
+
+    def _load(self, path):
+        # Decode straight to stereo float PCM at the stream rate
+        cmd = [FFMPEG_BINARY, "-loglevel", "error", "-i", path, "-f", "f32le", "-ac", "2", "-ar", str(self.fps), "-"]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            print(f"Error loading audio file {path}: {result.stderr.decode(errors='replace').strip()}")
+            return np.zeros((0, 2), dtype=np.float32)
+        return np.frombuffer(result.stdout, dtype="<f4").reshape(-1, 2)
+
+    def bounce(self, t):
+        self.play_until = max(self.play_until, t + SONG_CHUNK)
+
+    def clip(self, t, path, gain=1.0):
+        if path not in self.clips:
+            self.clips[path] = self._load(path)
+        self.voices.append([self.clips[path], 0, gain])
+
+    def render(self, t0, n_samples):
+        block = np.zeros((n_samples, 2), dtype=np.float32)
+
+        playing = int(np.clip(np.ceil((self.play_until - t0) * self.fps), 0, n_samples))
+        if playing:
+            chunk = self.song[self.song_cursor:self.song_cursor + playing]
+            block[:len(chunk)] += chunk
+            self.song_cursor += len(chunk)
+
+        for voice in self.voices:
+            samples, offset, gain = voice
+            chunk = samples[offset:offset + n_samples]
+            block[:len(chunk)] += chunk if gain == 1 else chunk * gain
+            voice[1] += len(chunk)
+        self.voices = [v for v in self.voices if v[1] < len(v[0])]
+
+        return (np.clip(block, -1, 1) * 32767).astype("<i2").tobytes()
+
+class PipeFeeder(threading.Thread):
+    """Drains a bounded queue of byte blocks into a pipe so ffmpeg stalls never block rendering."""
+
+    def __init__(self, pipe, maxsize):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.high_water = 0
+        self.error = None
+
+    def put(self, data, block=True):
+        """Queues a block; waits for room unless block is False. Returns whether it was queued."""
+        try:
+            self.queue.put(data, block=block)
+        except queue.Full:
+            return False
+        self.high_water = max(self.high_water, self.queue.qsize())
+        return True
+
+    def offer(self, data):
+        return self.put(data, block=False)
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is not None:
+                # The pipe is gone; keep draining so close() and blocking producers never hang
+                continue
+            try:
+                self.pipe.write(data)
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+        try:
+            self.pipe.close()
+        except OSError:
+            pass
+
+    def close(self):
+        self.queue.put(None)
+
+def stream_format(target):
+    if target.startswith("rtmp://"):
+        return "flv"
+    return "mpegts"
+
+def open_stream(target, config):
+    """Starts ffmpeg reading rgb24 frames on stdin and s16le audio on a second pipe."""
+    if "://" not in target and not os.path.exists(target):
+        os.mkfifo(target)
+
+    width, height = config["VIDEO_SIZE"]
+    fps = config["FPS"]
+    audio_read, audio_write = os.pipe()
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-thread_queue_size", "512",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+    ]
+    if config["STREAM_POLICY"] == "drop":
+        # Dropped ticks leave holes; stamp frames with arrival time and let ffmpeg keep the output CFR
+        cmd += ["-use_wallclock_as_timestamps", "1"]
+    cmd += [
+        "-i", "pipe:0",
+        # Raw PCM needs no probing; the default probesize would wait for ~30 s of audio before starting
+        "-thread_queue_size", "512", "-probesize", "32", "-analyzeduration", "0",
+        "-f", "s16le", "-ar", str(config["AUDIO_FPS"]), "-ac", "2", "-i", f"pipe:{audio_read}",
+        "-c:v", "libx264", "-preset", config["STREAM_PRESET"], "-tune", "zerolatency",
+        "-pix_fmt", "yuv420p", "-g", str(fps * 2), "-b:v", config["STREAM_BITRATE"], "-fps_mode", "cfr", "-r", str(fps),
+        "-c:a", "aac", "-ar", str(config["AUDIO_FPS"]),
+        "-f", stream_format(target), target,
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, pass_fds=(audio_read,))
+    os.close(audio_read)
+    return proc, os.fdopen(audio_write, "wb")
+
+# moviepy's named clip positions, as fractions of the free space along each axis
+X_ANCHORS = {"left": 0, "center": 0.5, "right": 1}
+Y_ANCHORS = {"top": 0, "center": 0.5, "bottom": 1}
+NAMED_POSITIONS = {"center": ("center", "center"), "left": ("left", "center"), "right": ("right", "center"),
+                   "top": ("center", "top"), "bottom": ("center", "bottom")}
+
+def overlay_offset(value, anchors, free_space):
+    if isinstance(value, str):
+        if value not in anchors:
+            raise ValueError(f"Unsupported text position {value!r}; use one of {', '.join(anchors)} or pixels")
+        return int(free_space * anchors[value])
+    return int(value)
+
+def text_overlays(config):
+    """(rgba, x, y) for every TEXT_CLIPS entry, rasterized once through the text cache."""
+    overlays = []
+    width, height = config["VIDEO_SIZE"]
+    for clip_cfg in config["TEXT_CLIPS"]:
+        rgba = render_text_rgba(clip_cfg["text"], config["FONT_PATH"], clip_cfg["font_size"],
+                                config["TEXT_COLOR"], clip_cfg["opacity"])
+        position = clip_cfg["position"]
+        if isinstance(position, str):
+            if position not in NAMED_POSITIONS:
+                raise ValueError(f"Unsupported text position {position!r}; use one of {', '.join(NAMED_POSITIONS)}")
+            position = NAMED_POSITIONS[position]
+        x, y = position
+        overlays.append((rgba, overlay_offset(x, X_ANCHORS, width - rgba.shape[1]),
+                         overlay_offset(y, Y_ANCHORS, height - rgba.shape[0])))
+    return overlays
+
+def draw_overlays(frame, overlays):
+    for rgba, x, y in overlays:
+        h, w = rgba.shape[:2]
+        region = frame[y:y + h, x:x + w]
+        alpha = rgba[:region.shape[0], :region.shape[1], 3:4].astype(np.float32) / 255
+        region[:] = (rgba[:region.shape[0], :region.shape[1], :3] * alpha + region * (1 - alpha)).astype(np.uint8)
+
+class StreamMetrics:
+    def __init__(self):
+        self.ticks = 0
+        self.rendered = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.backpressure = 0
+        self.max_lag = 0.0
+        self.render_time = 0.0
+
+    def as_dict(self, video_feeder, audio_feeder):
+        return {
+            "ticks": self.ticks,
+            "rendered": self.rendered,
+            "duplicated": self.duplicated,
+            "dropped": self.dropped,
+            "encoder_backpressure": self.backpressure,
+            "max_lag_ms": self.max_lag * 1000,
+            "avg_render_ms": self.render_time / max(self.rendered, 1) * 1000,
+            "video_queue_high_water": video_feeder.high_water,
+            "audio_queue_high_water": audio_feeder.high_water,
+        }
+
+    def print(self, video_feeder, audio_feeder):
+        m = self.as_dict(video_feeder, audio_feeder)
+        print(f"📡 {m['ticks']} ticks: {m['rendered']} rendered, {m['duplicated']} duplicated, "
+              f"{m['dropped']} dropped, {m['encoder_backpressure']} backpressure, "
+              f"max lag {m['max_lag_ms']:.1f} ms, render {m['avg_render_ms']:.1f} ms, "
+              f"queue peak {m['video_queue_high_water']} video, {m['audio_queue_high_water']} audio")
+
+def stream_video(config, colors=None, max_seconds=None):
+    """Streams scenes live until max_seconds (or one VIDEO_DURATION without STREAM_LOOP); returns metrics."""
+    config = {**STREAM_DEFAULTS, **config}
+    fps = config["FPS"]
+    audio_fps = config["AUDIO_FPS"]
+    if max_seconds is None and not config["STREAM_LOOP"]:
+        max_seconds = config["VIDEO_DURATION"]
+
+    proc, audio_pipe = open_stream(config["STREAM_TARGET"], config)
+    video_feeder = PipeFeeder(proc.stdin, config["STREAM_QUEUE_SIZE"])
+    # Audio is never dropped, it is what keeps the stream's timeline continuous; a full queue
+    # makes rendering wait for ffmpeg instead
+    audio_feeder = PipeFeeder(audio_pipe, config["STREAM_QUEUE_SIZE"])
+    video_feeder.start()
+    audio_feeder.start()
+
+    overlays = text_overlays(config)
+    ball_modes = {ball_id: cfg.get("mode", "clip") for ball_id, cfg in config["BALL_AUDIO"].items()}
+    # Same song as write_audio_track uses offline
+    audio = StreamingAudio(config["SONG_PATH"] if "song" in ball_modes.values() else None, audio_fps)
+    metrics = StreamMetrics()
+
+    scene = None
+    scene_start = 0.0
+    previous_t = 0.0
+    last_frame = None
+    samples_sent = 0
+    renderer = None
+
+    clock_start = time.perf_counter()
+    last_report = clock_start
+    tick = 0
+    try:
+        while max_seconds is None or tick < max_seconds * fps:
+            stream_t = tick / fps
+            if scene is None or stream_t - scene_start >= config["VIDEO_DURATION"]:
+                scene = Scene(config, colors)
+                if renderer is None:
+                    # Every looped scene is built from the same config, so one palette covers them all
+                    renderer = make_renderer(config, scene.balls, scene.obstacles)
+                scene_start = stream_t
+                previous_t = 0.0
+                seen_events = 0
+
+            # Simulation always advances by exactly one frame so physics and audio stay deterministic
+            t = stream_t - scene_start
+            update_balls(scene.balls, t - previous_t, t)
+            previous_t = t
+            handle_collisions(scene.balls, scene.obstacles, t, scene.events)
+
+            if len(scene.events) > seen_events:
+                bounce_times, clip_events = audio_events(scene.events.since(seen_events), scene.balls, config)
+                for bounce_t in bounce_times.tolist():
+                    audio.bounce(scene_start + bounce_t)
+                for clip_t, path, gain in clip_events:
+                    audio.clip(scene_start + clip_t, path, gain)
+                seen_events = len(scene.events)
+
+            n_samples = int(round((tick + 1) * audio_fps / fps)) - samples_sent
+            audio_feeder.put(audio.render(stream_t, n_samples))
+            samples_sent += n_samples
+
+            lag = time.perf_counter() - (clock_start + stream_t)
+            metrics.max_lag = max(metrics.max_lag, lag)
+            if lag > 1.0 / fps and last_frame is not None:
+                # Behind schedule: skip rasterization for this tick
+                if config["STREAM_POLICY"] == "duplicate":
+                    if video_feeder.offer(last_frame):
+                        metrics.duplicated += 1
+                    else:
+                        metrics.backpressure += 1
+                else:
+                    metrics.dropped += 1
+            else:
+                render_start = time.perf_counter()
+                # Overlays go on a copy so the renderer's persistent frame stays overlay-free
+                frame = renderer.render(scene_primitives(scene.balls, scene.obstacles, t)).copy()
+                draw_overlays(frame, overlays)
+                last_frame = frame.tobytes()
+                metrics.render_time += time.perf_counter() - render_start
+                metrics.rendered += 1
+                if not video_feeder.offer(last_frame):
+                    metrics.backpressure += 1
+
+            metrics.ticks += 1
+            tick += 1
+
+            if video_feeder.error or audio_feeder.error:
+                print(f"❌ Stream output closed: {video_feeder.error or audio_feeder.error}")
+                break
+
+            now = time.perf_counter()
+            if now - last_report >= config["STREAM_METRICS_INTERVAL"]:
+                metrics.print(video_feeder, audio_feeder)
+                last_report = now
+
+            # Pace to the wall clock
+            delay = clock_start + tick / fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        video_feeder.close()
+        audio_feeder.close()
+        video_feeder.join()
+        audio_feeder.join()
+        proc.wait()
+
+    metrics.print(video_feeder, audio_feeder)
+    return metrics.as_dict(video_feeder, audio_feeder)
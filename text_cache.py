@@ -0,0 +1,61 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from moviepy import ImageClip, TextClip
+
+CACHE_DIR = os.path.join("cache", "text")
+
+_memory = {}
+_lock = threading.Lock()
+
+def text_key(text, font, font_size, color, opacity):
+    # Font mtime is part of the key so replacing a font file invalidates its renders
+    font_mtime = os.path.getmtime(font) if os.path.exists(font) else 0
+    raw = repr((text, os.path.abspath(font), font_mtime, font_size, tuple(color), round(opacity, 4)))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def render_text_rgba(text, font, font_size, color, opacity=1.0, cache_dir=CACHE_DIR):
+    """Returns the rasterized text as an RGBA uint8 array, opacity baked into alpha.
+
+    Looks in the per-process memory cache, then the on-disk cache, and only then
+    asks moviepy/Pillow to render it."""
+    key = text_key(text, font, font_size, color, opacity)
+    with _lock:
+        rgba = _memory.get(key)
+    if rgba is not None:
+        return rgba
+
+    path = os.path.join(cache_dir, key + ".npy")
+    if os.path.exists(path):
+        try:
+            rgba = np.load(path)
+        except (OSError, ValueError):
+            rgba = None
+
+    if rgba is None:
+        clip = TextClip(font=font, text=text, font_size=font_size, color="#%02x%02x%02x" % tuple(color))
+        rgb = clip.get_frame(0)
+        alpha = clip.mask.get_frame(0) * opacity
+        rgba = np.dstack([rgb, np.round(alpha * 255)]).astype(np.uint8)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent workers never read a half-written file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, rgba)
+        os.replace(tmp_path, path)
+
+    with _lock:
+        _memory[key] = rgba
+    return rgba
+
+def cached_text_clip(text, font, font_size, color, opacity, duration, position):
+    rgba = render_text_rgba(text, font, font_size, color, opacity)
+    return ImageClip(rgba, transparent=True).with_duration(duration).with_position(position)
+
+def warm_text_cache(entries, font, color):
+    """Pre-renders (text, font_size, opacity) entries into the cache."""
+    for text, font_size, opacity in entries:
+        render_text_rgba(text, font, font_size, color, opacity)
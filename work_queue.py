@@ -0,0 +1,269 @@
+"""Shared-directory work queue for spreading batch renders over several machines.
+
+Every node needs the repo (fonts/, sounds/) and the same queue directory, e.g. an NFS
+or SMB mount. There is no broker; state lives in the directory layout:
+
+    <queue>/pending/<job>.json                        waiting to be claimed
+    <queue>/claimed/<job>@<worker>@<ts>.json          being rendered; mtime is the heartbeat
+    <queue>/done/<job>.json, <queue>/failed/<job>.json
+    <queue>/reports/<job>.json                        per-job render report
+    <queue>/output/                                   rendered videos
+
+Claims are a single os.rename from pending/ to claimed/, which only one worker can win.
+
+    python work_queue.py enqueue /mnt/render-queue
+    python work_queue.py worker  /mnt/render-queue     # on as many machines as you like
+    python work_queue.py status  /mnt/render-queue
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from BallPlayingMusicFill import generate_video
+from batch_generate import build_config, sanitize_filename, warm_caches
+
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 120
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5
+
+STATES = ["pending", "claimed", "done", "failed", "reports", "output"]
+
+def queue_path(queue_dir, state, name=""):
+    return os.path.join(queue_dir, state, name)
+
+def ensure_layout(queue_dir):
+    for state in STATES:
+        os.makedirs(queue_path(queue_dir, state), exist_ok=True)
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def parse_claim(filename):
+    """Splits a claimed/ filename into (job_id, worker_id, claimed_at)."""
+    job_id, worker_id, claimed_at = filename[:-len(".json")].rsplit("@", 2)
+    return job_id, worker_id, int(claimed_at)
+
+def known_job_ids(queue_dir):
+    ids = set()
+    for state in ("pending", "claimed", "done", "failed"):
+        for filename in os.listdir(queue_path(queue_dir, state)):
+            if filename.endswith(".json"):
+                ids.add(parse_claim(filename)[0] if state == "claimed" else filename[:-len(".json")])
+    return ids
+
+def enqueue(queue_dir, sounds_dir="sounds"):
+    """Writes one job per song in sounds_dir that has no job or output yet."""
+    ensure_layout(queue_dir)
+    known = known_job_ids(queue_dir)
+    added = 0
+    for song in sorted(f for f in os.listdir(sounds_dir) if f.endswith(".mp3")):
+        job_id = sanitize_filename(os.path.splitext(song)[0])
+        output_name = f"BallPlay_{job_id}.mp4"
+        if job_id in known or os.path.exists(queue_path(queue_dir, "output", output_name)):
+            continue
+        # OUTPUT_FILE is set per worker in run_job, since nodes may mount the queue at different paths
+        config, gradient = build_config(song, output_name)
+        write_json_atomic(queue_path(queue_dir, "pending", f"{job_id}.json"), {
+            "job_id": job_id,
+            "song": song,
+            "output_name": output_name,
+            "config": config,
+            "colors": gradient,
+            "attempts": 0,
+            "created": time.time(),
+        })
+        added += 1
+    print(f"📥 Enqueued {added} jobs in {queue_dir}")
+    return added
+
+def claim_next(queue_dir, worker_id):
+    """Atomically moves the oldest pending job into claimed/; returns (claim_path, job) or None."""
+    for filename in sorted(os.listdir(queue_path(queue_dir, "pending"))):
+        if not filename.endswith(".json"):
+            continue
+        job_id = filename[:-len(".json")]
+        claim_name = f"{job_id}@{worker_id}@{int(time.time())}.json"
+        claim_path = queue_path(queue_dir, "claimed", claim_name)
+        try:
+            os.rename(queue_path(queue_dir, "pending", filename), claim_path)
+        except FileNotFoundError:
+            continue  # another worker won this one
+        os.utime(claim_path)
+        with open(claim_path) as f:
+            return claim_path, json.load(f)
+    return None
+
+def last_heartbeat(claim_path):
+    # The claim timestamp in the name covers the moment between rename and the first utime
+    return max(os.path.getmtime(claim_path), parse_claim(os.path.basename(claim_path))[2])
+
+def requeue_stale(queue_dir, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS):
+    """Returns claims whose worker stopped heartbeating to pending/ (or failed/ after max_attempts)."""
+    requeued = 0
+    now = time.time()
+    for filename in os.listdir(queue_path(queue_dir, "claimed")):
+        if not filename.endswith(".json"):
+            continue
+        claim_path = queue_path(queue_dir, "claimed", filename)
+        try:
+            if now - last_heartbeat(claim_path) < stale_after:
+                continue
+            # Take the claim away first so only one requeuer handles it
+            taken_path = claim_path + ".stale"
+            os.rename(claim_path, taken_path)
+        except (FileNotFoundError, ValueError, IndexError):
+            continue
+
+        with open(taken_path) as f:
+            job = json.load(f)
+        job["attempts"] += 1
+        job.setdefault("history", []).append({"worker": parse_claim(filename)[1], "event": "stale", "time": now})
+        state = "failed" if job["attempts"] >= max_attempts else "pending"
+        write_json_atomic(queue_path(queue_dir, state, f"{job['job_id']}.json"), job)
+        os.remove(taken_path)
+        print(f"♻️  {job['job_id']}: stale claim ➝ {state}")
+        requeued += 1
+    return requeued
+
+class Heartbeat:
+    """Touches the claim file every `interval` seconds while a job renders."""
+
+    def __init__(self, claim_path, interval=HEARTBEAT_INTERVAL):
+        self.claim_path = claim_path
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.claim_path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def run_job(queue_dir, claim_path, job, worker_id, max_attempts=MAX_ATTEMPTS):
+    job_id = job["job_id"]
+    started = time.time()
+    print(f"🎵 {job_id} on {worker_id}")
+    report = {"job_id": job_id, "song": job["song"], "worker": worker_id, "started": started,
+              "attempt": job["attempts"] + 1}
+
+    output_name = job.get("output_name") or os.path.basename(job["config"]["OUTPUT_FILE"])
+    # Jobs always render files (generate_video streams and returns metrics when STREAM_TARGET is set)
+    config = {**job["config"], "OUTPUT_FILE": queue_path(queue_dir, "output", output_name), "STREAM_TARGET": None}
+
+    with Heartbeat(claim_path) as heartbeat:
+        try:
+            scene = generate_video(config, colors=job["colors"], logger=None)
+            error = None
+        except Exception as e:
+            scene = None
+            error = repr(e)
+
+    report["finished"] = time.time()
+    report["seconds"] = report["finished"] - started
+    # Take the claim away first, like requeue_stale, so a requeue can't race the state change
+    taken_path = claim_path + ".finishing"
+    try:
+        if heartbeat.lost:
+            raise FileNotFoundError(claim_path)
+        os.rename(claim_path, taken_path)
+    except FileNotFoundError:
+        # The claim was requeued under us; someone else owns the job now
+        print(f"⚠️  {job_id}: claim lost while rendering, leaving the job to its new owner")
+        return False
+
+    if error is None:
+        report["status"] = "done"
+        report["output"] = os.path.join("output", output_name)
+        bounce_times, clip_events = scene.audio_events()
+        report["bounces"] = len(bounce_times)
+        report["clip_events"] = len(clip_events)
+        report["events"] = scene.events.stats()
+        state = "done"
+    else:
+        report["status"] = "error"
+        report["error"] = error
+        job["attempts"] += 1
+        job.setdefault("history", []).append({"worker": worker_id, "event": "error", "error": error,
+                                              "time": report["finished"]})
+        state = "failed" if job["attempts"] >= max_attempts else "pending"
+        print(f"❌ {job_id}: {error} ➝ {state}")
+
+    write_json_atomic(queue_path(queue_dir, "reports", f"{job_id}.json"), report)
+    write_json_atomic(queue_path(queue_dir, state, f"{job_id}.json"), job)
+    os.remove(taken_path)
+    return error is None
+
+def run_worker(queue_dir, worker_id=None, exit_when_empty=False):
+    ensure_layout(queue_dir)
+    worker_id = (worker_id or f"{socket.gethostname()}-{os.getpid()}").replace("@", "-")
+    warm_caches()
+    print(f"👷 Worker {worker_id} watching {queue_dir}")
+    while True:
+        requeue_stale(queue_dir)
+        claim = claim_next(queue_dir, worker_id)
+        if claim is None:
+            if exit_when_empty and not os.listdir(queue_path(queue_dir, "claimed")):
+                print(f"✅ Worker {worker_id}: queue empty")
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+        try:
+            run_job(queue_dir, *claim, worker_id)
+        except Exception as e:
+            # The claim stops heartbeating, so requeue_stale hands the job out again
+            print(f"❌ Worker {worker_id}: {claim[1]['job_id']} aborted: {e!r}")
+
+def status(queue_dir):
+    ensure_layout(queue_dir)
+    counts = {state: sum(1 for f in os.listdir(queue_path(queue_dir, state)) if f.endswith(".json"))
+              for state in ("pending", "claimed", "done", "failed")}
+    print("📊 " + "  ".join(f"{state}: {count}" for state, count in counts.items()))
+    for filename in sorted(os.listdir(queue_path(queue_dir, "claimed"))):
+        if filename.endswith(".json"):
+            job_id, worker, _ = parse_claim(filename)
+            age = time.time() - last_heartbeat(queue_path(queue_dir, "claimed", filename))
+            print(f"   {job_id} ➝ {worker} (heartbeat {age:.0f}s ago)")
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["enqueue", "worker", "status", "requeue"])
+    parser.add_argument("queue_dir")
+    parser.add_argument("--sounds", default="sounds", help="song directory for enqueue")
+    parser.add_argument("--worker-id")
+    parser.add_argument("--exit-when-empty", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        enqueue(args.queue_dir, args.sounds)
+    elif args.command == "worker":
+        run_worker(args.queue_dir, args.worker_id, args.exit_when_empty)
+    elif args.command == "requeue":
+        ensure_layout(args.queue_dir)
+        requeue_stale(args.queue_dir)
+    else:
+        status(args.queue_dir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())